@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  benchSheetToDataFrame.py
+#
+#  Times the column at a time valuesToDataFrame against the old row at a
+#  time conversion, on a synthetic valueRange shaped like the api returns
+#  (ragged lists of formatted strings).  No google access is needed.
+#
+#  python benchSheetToDataFrame.py [rows] [cols]
+#
+import random
+import sys
+import timeit
+
+import pandas as pd
+
+from gdriveFile import gdriveFile
+
+
+def makeValues(rows, cols):
+    random.seed(1)
+    values = [["label{}".format(c) for c in range(cols)]]
+    for r in range(rows):
+        row = []
+        for c in range(cols):
+            kind = c % 4
+            if kind == 0:
+                row.append("{:.2f}".format(random.random() * 1000))
+            elif kind == 1:
+                row.append(str(random.randint(0, 100000)))
+            elif kind == 2:
+                row.append(random.choice(["apple", "pear", "plum"]))
+            else:
+                row.append("{}/01/2020".format(random.randint(1, 12)))
+        # the api drops trailing empty cells
+        values.append(row[: cols - random.randint(0, 2)])
+    return values
+
+
+def legacySheetToDataFrame(values, usecols):
+    """
+    the original row at a time implementation, kept here for comparison
+    """
+
+    def addrow(row, usecols):
+        tempDict = {}
+        n = 0
+        for y, item in enumerate(row):
+            if usecols is None or y in usecols:
+                if len(item) > 0 and item[0].isdigit():
+                    try:
+                        item = float(item)
+                    except:
+                        pass
+                tempDict.update({y: item})
+                n += 1
+        for y in range(n, len(usecols)):
+            tempDict.update({usecols[y]: ""})
+        return (tempDict, n)
+
+    stuff = []
+    maxcols = 0
+    for row in values:
+        (newRow, cols) = addrow(row, usecols)
+        stuff.append(newRow)
+        maxcols = max(maxcols, cols)
+    c = list(stuff[0].values())
+    e = []
+    for n in range(maxcols):
+        if n >= len(c) or not c[n] or c[n] == "":
+            e.append(n)
+        else:
+            e.append(c[n])
+    df = pd.DataFrame(stuff[1:])
+    df.columns = e
+    return df
+
+
+def main(args):
+    rows = int(args[1]) if len(args) > 1 else 50000
+    cols = int(args[2]) if len(args) > 2 else 40
+    values = makeValues(rows, cols)
+    usecols = list(range(cols))
+
+    old = legacySheetToDataFrame(values, usecols)
+    new = gdriveFile.valuesToDataFrame(values, usecols=usecols)
+    pd.testing.assert_frame_equal(old, new, check_dtype=False)
+
+    tOld = min(
+        timeit.repeat(
+            lambda: legacySheetToDataFrame(values, usecols), number=1, repeat=3
+        )
+    )
+    tNew = min(
+        timeit.repeat(
+            lambda: gdriveFile.valuesToDataFrame(values, usecols=usecols),
+            number=1,
+            repeat=3,
+        )
+    )
+    print(f"{rows} rows x {cols} cols")
+    print(f"row at a time:    {tOld:8.3f}s")
+    print(f"column at a time: {tNew:8.3f}s  ({tOld / tNew:.1f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
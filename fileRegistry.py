@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  fileRegistry.py
+#
+#  Copyright 2020 Pete Siddall <pete.siddall@gmail.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+import collections
+import concurrent.futures
+import datetime
+import threading
+import time
+
+
+class SingleFlight(object):
+    """
+    Callers of do() with the same key at the same time share one call of
+    function, and its result or exception, rather than each making it
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}  # key -> Future of the call in progress
+
+    def do(self, key, function):
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = concurrent.futures.Future()
+                self.calls[key] = future
+        if not leader:
+            return future.result()
+        try:
+            result = function()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+
+class FileRegistry(object):
+    """
+    The process wide cache of gdriveFile objects behind gdfFromId, so a
+    file's info and versions are fetched once however many times, or
+    from however many threads, it's asked for.
+
+    Up to maxFiles are kept, the least recently used going first.  Once
+    an entry is ttl seconds old the file's modifiedTime is checked (one
+    small request) and if it has been edited since it was loaded it is
+    loaded again.  ttl=None never checks.  Loads and checks of the same
+    file at the same time are made once and shared.
+    """
+
+    SKEW_SECONDS = 5  # allowance for our clock being ahead of google's
+
+    def __init__(self, maxFiles=256, ttl=60):
+        self.maxFiles = maxFiles
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.flights = SingleFlight()
+
+    def get(self, key, load):
+        """
+        the registered file for key, from load() if there isn't a current
+        one
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        if entry is not None:
+            if (
+                self.ttl is None
+                or time.monotonic() - entry["checkedAt"] < self.ttl
+            ):
+                return entry["doc"]
+            if self.flights.do(("check", key), lambda: self.unchanged(entry)):
+                return entry["doc"]
+            self.forget(key, entry)
+        return self.flights.do(("load", key), lambda: self.add(key, load))
+
+    def add(self, key, load):
+        loadedAt = datetime.datetime.now(datetime.timezone.utc)
+        doc = load()
+        with self.lock:
+            self.entries[key] = {
+                "doc": doc,
+                "checkedAt": time.monotonic(),
+                "loadedAt": loadedAt,
+                "modifiedTime": None,
+            }
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxFiles:
+                self.entries.popitem(last=False)
+        return doc
+
+    def unchanged(self, entry):
+        """
+        True if the file hasn't been edited since entry was loaded, or
+        last found unchanged
+        """
+        modifiedTime = entry["doc"].forThread().getModifiedTime()
+        if entry["modifiedTime"] is None:
+            modified = datetime.datetime.fromisoformat(
+                modifiedTime.replace("Z", "+00:00")
+            )
+            same = modified < entry["loadedAt"] - datetime.timedelta(
+                seconds=FileRegistry.SKEW_SECONDS
+            )
+        else:
+            same = modifiedTime == entry["modifiedTime"]
+        if same:
+            entry["modifiedTime"] = modifiedTime
+            entry["checkedAt"] = time.monotonic()
+        return same
+
+    def forget(self, key, entry=None):
+        """
+        drop key, only if it's still entry when that's given
+        """
+        with self.lock:
+            if entry is None or self.entries.get(key) is entry:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def main(args):
+    print("use import fileRegistry ONLY")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(main(sys.argv))
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  frameCache.py
+#
+#  Copyright 2020 Pete Siddall <pete.siddall@gmail.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+class FrameCache(object):
+    """
+    An on-disk cache of the dataframes built from spreadsheet tabs, so a
+    new process doesn't have to download an unchanged sheet again.
+
+    Entries are keyed by spreadsheet id, sheet name, the file's drive
+    modifiedTime and the options used to fetch it, so an edited sheet
+    simply misses.  Frames are written as uncompressed Feather files and
+    memory mapped when read back, numeric columns staying in the mapped
+    file rather than being copied.  A column arrow can't type, like the
+    numbers and "" blanks of a sheet column with empty cells, is stored as
+    the text of each cell alongside a code for its type, and rebuilt as it
+    was; a frame which still won't go is pickled instead.  When the
+    directory grows past maxBytes the least recently used files go.
+
+    with gf.gdriveAccess() as access:
+        gdoc = gf.gdriveFile.gdfFromId(fid, access)
+        gdf = gdoc.toDataFrame(diskCache=FrameCache("~/.cache/gdrive"))
+    """
+
+    LABELS = b"gdriveLabels"  # feather schema metadata holding the labels
+    MIXED = b"gdriveMixed"  # and the positions of the encoded columns
+    # the type codes of a mixed column's cells, in the order they're tested
+    CELL_TYPES = (
+        (0, (str,), str),
+        (1, (bool, np.bool_), lambda text: text == "True"),
+        (2, (int, np.integer), int),
+        (3, (float, np.floating), float),
+    )
+
+    def __init__(self, directory, maxBytes=1024 * 1024 * 1024):
+        self.directory = os.path.expanduser(directory)
+        self.maxBytes = maxBytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def makeKey(fid, sheet, version, **options):
+        """
+        everything which makes one cached frame different from another
+        """
+        key = json.dumps(
+            [fid, sheet, version, sorted(options.items())], default=str
+        )
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def paths(self, key):
+        base = os.path.join(self.directory, key)
+        return (base + ".feather", base + ".pkl")
+
+    def load(self, key):
+        """
+        return the cached dataframe, or None if there isn't one
+        """
+        featherPath, picklePath = self.paths(key)
+        try:
+            if os.path.exists(featherPath):
+                df = self.readFeather(featherPath)
+                path = featherPath
+            elif os.path.exists(picklePath):
+                df = pd.read_pickle(picklePath)
+                path = picklePath
+            else:
+                return None
+        except (
+            ImportError,
+            OSError,
+            ValueError,
+            EOFError,
+            pickle.UnpicklingError,
+        ) as e:
+            # evicted by another process, or no pyarrow here
+            print(f"FrameCache ignoring {key}: {e}")
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return df
+
+    def save(self, key, df):
+        """
+        write the dataframe under key, then trim the cache back to size
+        """
+        featherPath, picklePath = self.paths(key)
+        try:
+            self.writeFeather(featherPath, df)
+        except (ImportError, TypeError, ValueError):
+            self.atomicWrite(picklePath, lambda fd: df.to_pickle(fd))
+        self.evict()
+
+    @staticmethod
+    def readFeather(path):
+        import pyarrow.feather
+
+        table = pyarrow.feather.read_table(path, memory_map=True)
+        metadata = table.schema.metadata
+        labels = json.loads(metadata[FrameCache.LABELS])
+        mixed = json.loads(metadata.get(FrameCache.MIXED, b"[]"))
+        codes = {n: table.column(f"k{n}").to_numpy() for n in mixed}
+        table = table.drop_columns([f"k{n}" for n in mixed])
+        # unconsolidated, so the numeric columns are views of the file
+        df = table.to_pandas(split_blocks=True)
+        for n in mixed:
+            df[str(n)] = FrameCache.decodeMixed(
+                df[str(n)].to_numpy(dtype=object), codes[n]
+            )
+        df.columns = labels
+        return df
+
+    @staticmethod
+    def encodeMixed(cells):
+        """
+        the text and type code of each cell of a column mixing strings,
+        bools, ints and floats; TypeError for anything else
+        """
+        text = []
+        codes = np.empty(len(cells), dtype="int8")
+        for i, cell in enumerate(cells):
+            for code, types, parse in FrameCache.CELL_TYPES:
+                if isinstance(cell, types):
+                    break
+            else:
+                raise TypeError(f"can't encode {type(cell)}")
+            text.append(str(cell))
+            codes[i] = code
+        return text, codes
+
+    @staticmethod
+    def decodeMixed(text, codes):
+        """
+        the cells encodeMixed turned into text and codes, as they were
+        """
+        cells = np.array(text, dtype=object)
+        for code, types, parse in FrameCache.CELL_TYPES[1:]:
+            chosen = codes == code
+            if chosen.any():
+                cells[chosen] = [parse(t) for t in text[chosen]]
+        return cells
+
+    def writeFeather(self, path, df):
+        import pyarrow
+        import pyarrow.feather
+
+        # feather needs string column names, the real labels (which may be
+        # column numbers) go in the schema metadata
+        renamed = df.set_axis(
+            [str(n) for n in range(len(df.columns))], axis=1
+        )
+        mixed = []
+        for n, column in enumerate(renamed.columns):
+            if renamed[column].dtype != object:
+                continue
+            try:
+                pyarrow.array(renamed[column], from_pandas=True)
+            except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+                text, codes = FrameCache.encodeMixed(renamed[column])
+                renamed[column] = text
+                renamed[f"k{n}"] = codes
+                mixed.append(n)
+        table = pyarrow.Table.from_pandas(renamed, preserve_index=False)
+        labels = json.dumps(list(df.columns))
+        table = table.replace_schema_metadata(
+            {
+                **(table.schema.metadata or {}),
+                FrameCache.LABELS: labels,
+                FrameCache.MIXED: json.dumps(mixed),
+            }
+        )
+        self.atomicWrite(
+            path,
+            lambda fd: pyarrow.feather.write_feather(
+                table, fd, compression="uncompressed"
+            ),
+        )
+
+    def atomicWrite(self, path, writer):
+        """
+        write to a temporary file and rename it into place, so a reader in
+        another process never sees half a file
+        """
+        fd, tmpPath = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            writer(tmpPath)
+            os.replace(tmpPath, path)
+        finally:
+            if os.path.exists(tmpPath):
+                os.remove(tmpPath)
+
+    def evict(self):
+        """
+        remove least recently used entries until under maxBytes
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith((".feather", ".pkl")):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.maxBytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith((".feather", ".pkl", ".tmp")):
+                os.remove(entry.path)
+
+
+def main(args):
+    print("use import frameCache ONLY")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(main(sys.argv))
@@ -24,18 +24,86 @@
 import oauth2client.file
 import oauth2client.client
 import oauth2client.tools
+from oauth2client.service_account import ServiceAccountCredentials
+import httplib2  # comes with oauth2client
 
 # google-api-python-client provides the next two
 import apiclient.discovery
+import apiclient.errors
 import apiclient.http
+import collections
+import collections.abc
+import contextlib
+import copy
+import csv
+import datetime
+import io
+import itertools
+import json
 import pprint
+import numpy as np
 import pandas as pd
 import os.path
+import re
+import tempfile
+import threading
+import time
+import concurrent.futures
+import random
+import urllib.request
+
+import fileRegistry
+import requestScheduler
+
+try:
+    import fcntl
+except ImportError:
+    # not on windows, SharedTokenStorage then only locks between threads
+    fcntl = None
+
+# the characters float() will accept once the first one is known to be a digit
+FLOAT_CHARS = "0123456789.eE+-_ "
 
 
 class gdriveFile:
     GDOC_SHEET_MIMETYPE = "application/vnd.google-apps.spreadsheet"
     GDOC_DOC_MIMETYPE = "application/vnd.google-apps.document"
+    # the files gdfFromId has loaded, shared by the whole process
+    REGISTRY = fileRegistry.FileRegistry()
+    # valueRenderOption for cacheFileData, FORMATTED_VALUE gives the
+    # display strings, UNFORMATTED_VALUE numbers and serial date-times
+    FORMATTED_VALUE = "FORMATTED_VALUE"
+    UNFORMATTED_VALUE = "UNFORMATTED_VALUE"
+    # Sheets counts serial date-times in days from here
+    SERIAL_DATE_ORIGIN = "1899-12-30"
+    # partial response masks for the metadata we actually use, without
+    # them a spreadsheet's formats, named and protected ranges all come too
+    SHEET_INFO_FIELDS = (
+        "spreadsheetId,properties.title,"
+        "sheets.properties(sheetId,title,index,gridProperties)"
+    )
+    FILE_INFO_FIELDS = (
+        "originalFilename,fullFileExtension,fileExtension,mimeType,"
+        "properties"
+    )
+    REVISION_FIELDS = "revisions(id,modifiedTime,lastModifyingUser)"
+    # keep values().batchUpdate payloads under the api's suggested limit
+    WRITE_BATCH_BYTES = 2 * 1024 * 1024
+    # upload/download chunk size, a multiple of 256k as the api needs
+    TRANSFER_CHUNK_BYTES = 8 * 1024 * 1024
+    TRANSFER_RETRIES = 5  # per chunk, with the client's backoff
+    # one tab of a spreadsheet as csv, files().export only gives the first
+    SHEET_CSV_URL = (
+        "https://docs.google.com/spreadsheets/d/{}/export?format=csv&gid={}"
+    )
+    EXPORT_TIMEOUT = 120  # seconds a csv export may stall before a retry
+    # what google's own documents download as
+    EXPORT_MIMETYPES = {
+        GDOC_SHEET_MIMETYPE: "application/vnd.openxmlformats-"
+        "officedocument.spreadsheetml.sheet",
+        GDOC_DOC_MIMETYPE: "application/vnd.openxmlformats-"
+        "officedocument.wordprocessingml.document",
+    }
 
     @staticmethod
     def findDriveFile(access, query):
@@ -89,6 +157,43 @@ class gdriveFile:
 
             return 0
 
+    @staticmethod
+    def loadMany(access, idsOrQueries, maxWorkers=8, **toDataFrameArgs):
+        """
+        fetch many spreadsheets at once over a pool of threads, yielding
+        (idOrQuery, gdriveFile, SheetFrames) for each as it completes
+
+        idsOrQueries: file ids or urls for gdfFromId, or drive search
+        queries for findDriveFile
+        toDataFrameArgs: passed on to toDataFrame, every sheet is fetched
+        failures are printed and yielded as (idOrQuery, None, None)
+        """
+
+        def load(item):
+            threadAccess = access.forThread()
+            if item[:4] == "http" or re.fullmatch(r"[\w-]+", item):
+                doc = gdriveFile.gdfFromId(item, threadAccess)
+            else:
+                doc = gdriveFile.findDriveFile(threadAccess, item)
+                if not doc:
+                    raise ValueError(f"no single file matches {item}")
+            frames = doc.toDataFrame(lazy=False, **toDataFrameArgs)
+            # anything fetched later comes from the caller's thread
+            doc.cacheAccess(access)
+            return doc, frames
+
+        with concurrent.futures.ThreadPoolExecutor(maxWorkers) as pool:
+            futures = {pool.submit(load, item): item for item in idsOrQueries}
+            for future in concurrent.futures.as_completed(futures):
+                item = futures[future]
+                try:
+                    doc, frames = future.result()
+                except Exception as e:
+                    print(f"loadMany({item}) failed: {e!r}")
+                    yield item, None, None
+                else:
+                    yield item, doc, frames
+
     @staticmethod
     def colnum_string(n: int) -> str:
         """
@@ -113,6 +218,77 @@ class gdriveFile:
             n += ord(c) - 64
         return n
 
+    @staticmethod
+    def a1Range(
+        sheet, firstCol=None, lastCol=None, firstRow=None, lastRow=None
+    ):
+        """
+        Build an A1 range on the named sheet, the sheet name is quoted
+        columns are numbers starting at 1, leave them out for whole rows
+        leave the rows out for whole columns, firstRow defaults to 1
+        """
+        quoted = "'{}'".format(sheet.replace("'", "''"))
+        if firstCol is None and lastRow is None:
+            return quoted
+        if lastRow is not None and firstRow is None:
+            firstRow = 1
+        if firstCol is None:
+            return "{}!{}:{}".format(quoted, firstRow, lastRow)
+        first = gdriveFile.colnum_string(firstCol)
+        last = gdriveFile.colnum_string(lastCol or firstCol)
+        if lastRow is None:
+            return "{}!{}{}:{}".format(quoted, first, firstRow or "", last)
+        return "{}!{}{}:{}{}".format(quoted, first, firstRow, last, lastRow)
+
+    @staticmethod
+    def rangeEnd(a1):
+        """
+        the 1 based (column, row) of the bottom right cell of an A1 range,
+        either is None if the range is open in that direction
+        """
+        cell = a1.rsplit("!", 1)[-1].split(":")[-1]
+        m = re.match(r"^([A-Z]*)(\d*)$", cell)
+        col, row = m.groups()
+        return (
+            gdriveFile.string_colnum(col) if col else None,
+            int(row) if row else None,
+        )
+
+    @staticmethod
+    def columnRuns(usecols):
+        """
+        Group 0 based column numbers into [first, last] runs of neighbours
+        so each run can be fetched as one range
+        """
+        runs = []
+        for c in sorted(set(usecols)):
+            if runs and c == runs[-1][1] + 1:
+                runs[-1][1] = c
+            else:
+                runs.append([c, c])
+        return runs
+
+    @staticmethod
+    def stitchRanges(valueRanges, runs):
+        """
+        Put the rows of side by side column ranges back together, padding
+        each range out to its width so the cells line up
+        """
+        rowLists = [vr.get("values", []) for vr in valueRanges]
+        widths = [last - first + 1 for first, last in runs]
+        stitched = []
+        for i in range(max((len(rows) for rows in rowLists), default=0)):
+            row = []
+            for rows, width in zip(rowLists, widths):
+                cells = rows[i] if i < len(rows) else []
+                row.extend(cells)
+                row.extend([""] * (width - len(cells)))
+            while row and row[-1] == "":
+                # as the api does, drop trailing empty cells
+                row.pop()
+            stitched.append(row)
+        return stitched
+
     @staticmethod
     def createValueRange(
         colname: str, startrow: int, data, arrayRepresents, sheet
@@ -133,7 +309,6 @@ class gdriveFile:
                 data = [i for i in data[0]]
 
             lenData = len(data)
-        print(lenData, data)
 
         valueRange = {}
         if arrayRepresents == "COLUMN":
@@ -187,20 +362,21 @@ class gdriveFile:
                 # maybe need to flatten it
                 widthData = len(data[0])
                 if widthData > 1:
-                    # assume 2d data
-                    for n, i in enumerate(data):
-                        if len(i) != widthData:
-                            print(
-                                f"{n}th element >{i}< is {len(i)} rest are {widthData}"
-                            )
-                            raise ValueError
-
-                    data = [i for i in data]
+                    # assume 2d data, check the widths in one go and only
+                    # hunt for the odd one out if there is one
+                    widths = np.fromiter(map(len, data), int, lenData)
+                    if (widths != widthData).any():
+                        n = int(np.flatnonzero(widths != widthData)[0])
+                        i = data[n]
+                        print(
+                            f"{n}th element >{i}< is {len(i)} rest are {widthData}"
+                        )
+                        raise ValueError
             else:
                 data = [[i for i in data]]
                 widthData = 1
 
-        print(f"({lenData}, {widthData})", data)
+        print(f"({lenData}, {widthData})")
 
         valueRange = {}
         colnum = gdriveFile.string_colnum(colname)
@@ -232,7 +408,7 @@ class gdriveFile:
             )
         valueRange.update({"majorDimension": arrayOf + "S"})
         valueRange.update({"values": data})
-        print(valueRange)
+        print(valueRange["range"])
         return valueRange
 
     def __init__(self, fileDict):
@@ -252,14 +428,31 @@ class gdriveFile:
             == "document"
         )
         self.fileInfo = None
+        self.fileInfoFields = None
         self.fileData = None
+        self.valueRender = None
+        self.fileCols = None
+        self.fileRows = None
+        self.dateCols = {}
         self.sheetDict = {}
+        # the (usecols, maxRows, valueRender) each sheetDict frame was
+        # built with
+        self.sheetOptions = {}
         self.sheetLen = {}
+        self.pendingWrites = None
+        self.pendingRequests = None
+        self.pendingCallbacks = None
+        self.writeBytes = gdriveFile.WRITE_BATCH_BYTES
 
     @classmethod
-    def gdfFromId(cls, fid, access, docType="spreadsheet"):
+    def gdfFromId(cls, fid, access, docType="spreadsheet", shared=True):
         """
         classmethod allows alternate constructor
+
+        shared: look the file up in REGISTRY first, so asking for it again
+        doesn't fetch its info again.  Asked for with a different access
+        (eg from another thread) it comes back as a copy on that access,
+        see withAccess.  False always makes a new one
         """
         assert (
             docType[-11:] == "spreadsheet" or docType[-8:] == "document"
@@ -276,10 +469,16 @@ class gdriveFile:
         if docType == "document":
             docType = gdriveFile.GDOC_DOC_MIMETYPE
 
-        doc = cls({"id": fid, "mimeType": docType})
-        doc.cacheAccess(access)
-        doc.cacheFileInfo()
-        return doc
+        def load():
+            doc = cls({"id": fid, "mimeType": docType})
+            doc.cacheAccess(access)
+            doc.cacheFileInfo()
+            return doc
+
+        if not shared:
+            return load()
+        doc = gdriveFile.REGISTRY.get((cls, fid, docType), load)
+        return doc.withAccess(access)
 
     @classmethod
     def newgdf(cls, access, title="newGdriveFile"):
@@ -319,90 +518,284 @@ class gdriveFile:
         """
         cache the api access objects with the file
         """
+        if not isinstance(access, (gdriveAccess, AccessPool)):
+            print(f"type {type(access)} is not a gdriveAccess object")
+            raise TypeError
         self.access = access
-        if type(access) != gdriveAccess:
-            print("type {} is not a gdriveAcess object")
-            self.sheet_service = None
-            raise (typeError)
-        else:
-            self.sheet_service = self.access.sheet_service
-            self.docs_service = self.access.docs_service
 
-    def cacheFileInfo(self, force=False):
+    # through the access when used, so it only builds the apis we touch
+    @property
+    def sheet_service(self):
+        return self.access.sheet_service
+
+    @property
+    def docs_service(self):
+        return self.access.docs_service
+
+    def cacheFileInfo(self, force=False, fields=None):
         """
         pull down all sorts of useful info about the file
         in particular, we're after the title, number of sheets and their names
 
         force: if true, then re-cache the file
+        fields: a partial response mask of anything wanted beyond the
+        default SHEET_INFO_FIELDS/FILE_INFO_FIELDS, eg "namedRanges" or
+        "*" for everything
         """
         # assert(self.isSpreadSheet is True)
-        if self.fileInfo and not force:
+        if (
+            self.fileInfo
+            and not force
+            and (fields is None or fields == self.fileInfoFields)
+        ):
             return
         else:
-            if self.isSpreadSheet:
-                self.fileInfo = (
-                    self.sheet_service.spreadsheets()
-                    .get(spreadsheetId=self.gdocId)
-                    .execute()
-                )
-                self.title = self.fileInfo["properties"]["title"]
-                self.sheets = [
-                    s["properties"]["title"]
-                    for s in self.fileInfo["sheets"]
-                ]
-                # set columnCount, rowCount
-                self.sheetMaxSize = [
-                    s["properties"]["gridProperties"]
-                    for s in self.fileInfo["sheets"]
-                ]
-                self.defaultSheet = self.sheets[0]
-            elif self.isDocument:
-                self.fileInfo = (
-                    self.docs_service.documents()
-                    .get(documentId=self.gdocId)
-                    .execute()
-                )
-                self.title = self.fileInfo["title"]
-            else:
-                self.fileInfo = (
-                    self.access.drive_service.files()
-                    .get(
-                        fileId=self.gdocId,
-                        fields="originalFilename,fullFileExtension,fileExtension,mimeType,properties/*",
-                    )
-                    .execute()
-                )
-
+            self.setFileInfo(self.fileInfoRequest(fields).execute())
+            self.fileInfoFields = fields
             self.versionInfo = self.getVersions()
 
-    def getVersions(self):
+    def fileInfoRequest(self, fields=None):
         """
-        ask for information about the document versions
+        the (unexecuted) request for cacheFileInfo's metadata
         """
-        resp = (
-            self.access.drive_service.revisions()
-            .list(
+        if self.isSpreadSheet:
+            return self.sheet_service.spreadsheets().get(
+                spreadsheetId=self.gdocId,
+                fields=gdriveFile.addFields(
+                    gdriveFile.SHEET_INFO_FIELDS, fields
+                ),
+            )
+        elif self.isDocument:
+            # the whole body is wanted for the outline
+            return self.docs_service.documents().get(documentId=self.gdocId)
+        else:
+            return self.access.drive_service.files().get(
                 fileId=self.gdocId,
-                fields="*",
-                pageSize=1000,
+                fields=gdriveFile.addFields(
+                    gdriveFile.FILE_INFO_FIELDS, fields
+                ),
             )
-            .execute()
+
+    @staticmethod
+    def addFields(default, extra):
+        """
+        extend a partial response mask with the caller's extra fields
+        """
+        if extra is None:
+            return default
+        return default + "," + extra
+
+    def setFileInfo(self, fileInfo):
+        """
+        cache the response to fileInfoRequest
+        """
+        self.fileInfo = fileInfo
+        if self.isSpreadSheet:
+            self.title = self.fileInfo["properties"]["title"]
+            self.sheets = [
+                s["properties"]["title"] for s in self.fileInfo["sheets"]
+            ]
+            # set columnCount, rowCount
+            self.sheetMaxSize = [
+                s["properties"]["gridProperties"]
+                for s in self.fileInfo["sheets"]
+            ]
+            self.defaultSheet = self.sheets[0]
+        elif self.isDocument:
+            self.title = self.fileInfo["title"]
+
+    def getVersions(self, fields=None):
+        """
+        ask for information about the document versions
+        fields: a partial response mask of any extra revision fields,
+        eg "revisions(size)"
+        """
+        return gdriveFile.parseVersions(
+            self.versionsRequest(fields).execute()
+        )
+
+    def versionsRequest(self, fields=None):
+        return self.access.drive_service.revisions().list(
+            fileId=self.gdocId,
+            fields=gdriveFile.addFields(gdriveFile.REVISION_FIELDS, fields),
+            pageSize=1000,
         )
+
+    @staticmethod
+    def parseVersions(resp):
         return [
             {
-                f: n[f]
+                f: n.get(f)
                 for f in ["id", "modifiedTime", "lastModifyingUser"]
             }
-            for n in resp["revisions"]
+            for n in resp.get("revisions", [])
         ]
 
-    def uploadNewFile(self, filename, mimetype="text/csv"):
+    @staticmethod
+    def cacheFileInfoMany(docs, force=False, batchSize=100, fields=None):
+        """
+        cacheFileInfo for many files at once: the metadata and revision
+        requests are sent as multipart http batches of up to batchSize
+        sub-requests, rather than two round trips per file.
+
+        A failed sub-request only affects its own file; each is printed
+        and returned as a list of (gdriveFile, exception)
+        fields: as for cacheFileInfo
+        """
+        jobs = []
+        for doc in docs:
+            if (
+                doc.fileInfo
+                and not force
+                and (fields is None or fields == doc.fileInfoFields)
+            ):
+                continue
+            if doc.isSpreadSheet:
+                service = doc.sheet_service
+            elif doc.isDocument:
+                service = doc.docs_service
+            else:
+                service = doc.access.drive_service
+
+            def onFileInfo(resp, doc=doc):
+                doc.setFileInfo(resp)
+                doc.fileInfoFields = fields
+
+            def onVersions(resp, doc=doc):
+                doc.versionInfo = gdriveFile.parseVersions(resp)
+
+            jobs.append(
+                (service, doc.fileInfoRequest(fields), doc, onFileInfo)
+            )
+            jobs.append(
+                (
+                    doc.access.drive_service,
+                    doc.versionsRequest(),
+                    doc,
+                    onVersions,
+                )
+            )
+        return gdriveFile.executeBatched(jobs, batchSize)
+
+    @staticmethod
+    def executeBatched(jobs, batchSize=100):
+        """
+        execute (service, request, doc, onReply) jobs in http batches,
+        calling onReply with each successful response.  A batch can only
+        go to the api whose service built its requests, so jobs are
+        grouped by service first
+
+        returns a list of (doc, exception) for the sub-requests which failed
+        """
+        groups = {}
+        for service, request, doc, onReply in jobs:
+            groups.setdefault(id(service), (service, []))[1].append(
+                (request, doc, onReply)
+            )
+
+        errors = []
+        bucketFor = requestScheduler.RequestScheduler.bucketFor
+        idempotent = requestScheduler.RequestScheduler.idempotent
+        retry = []
+        slowDown = set()
+
+        def quota(request):
+            # the scheduler and bucket of the credentials which built it
+            scheduler = getattr(request, "scheduler", None)
+            return (
+                scheduler or gdriveAccess.SCHEDULER,
+                bucketFor(request.uri, request.method),
+            )
+
+        def callback(requestId, response, exception):
+            request, doc, onReply = pending[requestId]
+            if exception is not None:
+                kind = requestScheduler.RequestScheduler.classify(exception)
+                if (
+                    kind == "slow"
+                    or kind == "retry"
+                    and idempotent(request.uri, request.method)
+                ) and attempt < quota(request)[0].maxRetries:
+                    # refused or failed on the server, go again later
+                    retry.append(pending[requestId])
+                    if kind == "slow":
+                        slowDown.add(quota(request))
+                    return
+                print(f"batched request for {doc.gdocId} failed: {exception}")
+                errors.append((doc, exception))
+            else:
+                onReply(response)
+
+        # every sub-request counts against its api's quota
+        for service, entries in groups.values():
+            for attempt in itertools.count():
+                for start in range(0, len(entries), batchSize):
+                    pending = {}
+                    batch = service.new_batch_http_request(callback=callback)
+                    for n, entry in enumerate(entries[start : start + batchSize]):
+                        pending[str(n)] = entry
+                        batch.add(entry[0], request_id=str(n))
+                    quotas = collections.Counter(
+                        quota(entry[0]) for entry in pending.values()
+                    )
+                    for (scheduler, bucket), count in quotas.items():
+                        scheduler.buckets[bucket].acquire(count)
+                    # the batch itself goes, and is retried, as its first
+                    # request would, its quota is already paid above
+                    batchScheduler, batchBucket = quota(entries[start][0])
+                    batchScheduler.call(
+                        batchBucket,
+                        batch.execute,
+                        cost=0,
+                        idempotent=all(
+                            idempotent(entry[0].uri, entry[0].method)
+                            for entry in pending.values()
+                        ),
+                    )
+                if not retry:
+                    break
+                for scheduler, bucket in slowDown:
+                    scheduler.throttle(bucket)
+                entries, retry = retry, []
+                slowDown.clear()
+                delay = quota(entries[0][0])[0].backoff(attempt)
+                print(f"retrying {len(entries)} batched requests in {delay:.1f}s")
+                time.sleep(delay)
+        return errors
+
+    def getModifiedTime(self):
+        """
+        one cheap call to see when the file last changed
+        """
+        resp = (
+            self.access.drive_service.files()
+            .get(fileId=self.gdocId, fields="modifiedTime")
+            .execute()
+        )
+        return resp["modifiedTime"]
+
+    def uploadNewFile(
+        self,
+        filename,
+        mimetype="text/csv",
+        chunkSize=None,
+        progress=None,
+        refresh=True,
+    ):
         """
         replace the existing version of the text with the named file
+
+        The upload is resumable and goes in chunkSize (TRANSFER_CHUNK_BYTES)
+        pieces, a failed piece is retried from where it got to rather than
+        starting again.  progress(sentBytes, totalBytes) is called after
+        each piece.  refresh: re-cache the file info afterwards
         """
         assert os.path.isfile(filename)
         fileData = apiclient.http.MediaFileUpload(
-            filename, mimetype=mimetype
+            filename,
+            mimetype=mimetype,
+            chunksize=chunkSize or gdriveFile.TRANSFER_CHUNK_BYTES,
+            resumable=True,
         )
         current_version = self.versionInfo[-1]["id"]
         try:
@@ -414,61 +807,579 @@ class gdriveFile:
         fileMetaData = {
             "properties": {"revisionId": new_version, "name": filename}
         }
-        update = (
-            self.access.drive_service.files()
-            .update(
-                fileId=self.gdocId,
-                body=fileMetaData,
-                media_body=fileData,
+        request = self.access.forThread().drive_service.files().update(
+            fileId=self.gdocId,
+            body=fileMetaData,
+            media_body=fileData,
+        )
+        update = None
+        while update is None:
+            status, update = request.next_chunk(
+                num_retries=gdriveFile.TRANSFER_RETRIES
             )
-            .execute()
+            if progress is not None:
+                if status is not None:
+                    progress(status.resumable_progress, status.total_size)
+                else:
+                    progress(fileData.size(), fileData.size())
+        if refresh:
+            self.cacheFileInfo(force=True)
+
+    def download(
+        self, path, mimetype=None, chunkSize=None, progress=None
+    ):
+        """
+        stream the file's contents to path a chunk at a time, so it is
+        never all in memory.  google sheets and documents are exported,
+        as mimetype or else EXPORT_MIMETYPES (xlsx/docx)
+
+        progress(receivedBytes, totalBytes) is called after each chunk
+        the data goes to path.part, renamed to path once it is complete
+        """
+        files = self.access.forThread().drive_service.files()
+        if self.isSpreadSheet:
+            exportType = gdriveFile.GDOC_SHEET_MIMETYPE
+        elif self.isDocument:
+            exportType = gdriveFile.GDOC_DOC_MIMETYPE
+        else:
+            exportType = None
+        if exportType is not None:
+            exportType = mimetype or gdriveFile.EXPORT_MIMETYPES[exportType]
+            request = files.export_media(
+                fileId=self.gdocId, mimeType=exportType
+            )
+        else:
+            request = files.get_media(fileId=self.gdocId)
+        partPath = path + ".part"
+        try:
+            with open(partPath, "wb") as fh:
+                downloader = apiclient.http.MediaIoBaseDownload(
+                    fh,
+                    request,
+                    chunksize=chunkSize or gdriveFile.TRANSFER_CHUNK_BYTES,
+                )
+                done = False
+                while not done:
+                    status, done = downloader.next_chunk(
+                        num_retries=gdriveFile.TRANSFER_RETRIES
+                    )
+                    if progress is not None:
+                        progress(status.resumable_progress, status.total_size)
+            os.replace(partPath, path)
+        finally:
+            if os.path.exists(partPath):
+                os.remove(partPath)
+
+    @staticmethod
+    def transferMany(transfer, docsAndPaths, maxWorkers, what):
+        """
+        run transfer(doc, path, progress) for each (gdriveFile, path) over a
+        thread pool, printing the combined progress as it goes
+
+        returns a list of (gdriveFile, path, exception) for those which
+        failed, each is printed too
+        """
+        docsAndPaths = list(docsAndPaths)
+        lock = threading.Lock()
+        moved = {}  # path -> (bytes so far, total)
+        finished = []
+
+        def report():
+            doneBytes = sum(done for done, total in moved.values())
+            totalBytes = sum(total or 0 for done, total in moved.values())
+            print(
+                f"{what}: {len(finished)}/{len(docsAndPaths)} files, "
+                f"{doneBytes / 1e6:.1f}MB of the {totalBytes / 1e6:.1f}MB "
+                "begun so far"
+            )
+
+        def one(doc, path):
+            def progress(done, total):
+                with lock:
+                    moved[path] = (done, total)
+                    report()
+
+            transfer(doc, path, progress)
+            with lock:
+                finished.append(path)
+                report()
+
+        errors = []
+        with concurrent.futures.ThreadPoolExecutor(maxWorkers) as pool:
+            futures = {
+                pool.submit(one, doc, path): (doc, path)
+                for doc, path in docsAndPaths
+            }
+            for future in concurrent.futures.as_completed(futures):
+                doc, path = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"{what}({doc.gdocId}, {path}) failed: {e!r}")
+                    errors.append((doc, path, e))
+        return errors
+
+    @staticmethod
+    def uploadMany(
+        docsAndPaths, mimetype="text/csv", maxWorkers=4, chunkSize=None
+    ):
+        """
+        uploadNewFile for many (gdriveFile, filename) pairs at once, each
+        thread on its own connection.  The file info of every uploaded
+        file is re-cached afterwards in batched requests
+
+        returns a list of (gdriveFile, filename, exception) failures
+        """
+        docsAndPaths = list(docsAndPaths)
+
+        def transfer(doc, path, progress):
+            doc.uploadNewFile(
+                path,
+                mimetype=mimetype,
+                chunkSize=chunkSize,
+                progress=progress,
+                refresh=False,
+            )
+
+        errors = gdriveFile.transferMany(
+            transfer, docsAndPaths, maxWorkers, "uploadMany"
+        )
+        failed = [doc for doc, path, e in errors]
+        gdriveFile.cacheFileInfoMany(
+            [doc for doc, path in docsAndPaths if doc not in failed],
+            force=True,
+        )
+        return errors
+
+    @staticmethod
+    def downloadMany(docsAndPaths, maxWorkers=4, chunkSize=None):
+        """
+        download for many (gdriveFile, path) pairs at once, each thread on
+        its own connection
+
+        returns a list of (gdriveFile, path, exception) failures
+        """
+
+        def transfer(doc, path, progress):
+            doc.download(path, chunkSize=chunkSize, progress=progress)
+
+        return gdriveFile.transferMany(
+            transfer, docsAndPaths, maxWorkers, "downloadMany"
         )
-        self.cacheFileInfo(force=True)
 
-    def cacheFileData(self):
+    def cacheFileData(self, valueRender=None, usecols=None, maxRows=None):
         """
         pull down cell values into one valuerange per sheet
-        valueRenderOption determines whether values are formatted,
-        unformatted, or formulae returned
+        valueRender determines whether values are formatted
+        (FORMATTED_VALUE, the default) or unformatted (UNFORMATTED_VALUE)
+        in which case numbers come back as numbers and date-times as
+        serial numbers, with the date columns noted in self.dateCols
+
+        usecols: 0 based column numbers, only these are requested from the
+        api, one range per run of neighbouring columns, stitched back
+        together so self.fileCols lists the sheet column of each value
+        maxRows: only request the first maxRows rows of each sheet
+        """
+        self.setFetchOptions(valueRender, usecols, maxRows)
+        missing = [
+            s
+            for s, vr in zip(self.sheets, self.fileData["valueRanges"])
+            if vr is None
+        ]
+        if missing:
+            self.fetchSheets(missing)
+
+    def cacheSheetData(
+        self, sheet, valueRender=None, usecols=None, maxRows=None
+    ):
+        """
+        as cacheFileData, but only pull down the one sheet
+        """
+        self.setFetchOptions(valueRender, usecols, maxRows)
+        if self.fileData["valueRanges"][self.sheets.index(sheet)] is None:
+            self.fetchSheets([sheet])
+
+    def setFetchOptions(self, valueRender, usecols, maxRows):
+        """
+        cached values are kept while they cover what is asked for,
+        otherwise they're thrown away, along with the dataframes built
+        from them, ready to be fetched again
         """
         assert self.isSpreadSheet is True
+        if valueRender is None:
+            valueRender = gdriveFile.FORMATTED_VALUE
+        assert valueRender in (
+            gdriveFile.FORMATTED_VALUE,
+            gdriveFile.UNFORMATTED_VALUE,
+        )
         self.cacheFileInfo()
-        if self.fileData:
+        fileCols = None if usecols is None else sorted(set(usecols))
+        if (
+            self.fileData
+            and self.valueRender == valueRender
+            and (self.fileCols is None or self.fileCols == fileCols)
+            and (self.fileRows is None or self.fileRows == maxRows)
+        ):
+            # what we have already covers the request, but there may be
+            # sheets added since
+            rangeList = self.fileData["valueRanges"]
+            rangeList.extend([None] * (len(self.sheets) - len(rangeList)))
             return
-        else:
-            params = {
-                "spreadsheetId": self.gdocId,
-                "ranges": self.sheets,
+        self.fileData = {
+            "spreadsheetId": self.gdocId,
+            "valueRanges": [None for s in self.sheets],
+        }
+        self.valueRender = valueRender
+        self.fileCols = fileCols
+        self.fileRows = maxRows
+        self.sheetDict = {}
+        self.sheetOptions = {}
+        self.lastCol = {}
+        self.lastRow = {}
+        self.dateCols = {}
+
+    def fetchSheets(self, sheets):
+        """
+        fetch the values of the named sheets, as set up by setFetchOptions
+        """
+        for sheet, values in zip(
+            sheets,
+            self.fetchRows(
+                sheets, self.fileCols, self.valueRender, lastRow=self.fileRows
+            ),
+        ):
+            self.fileData["valueRanges"][self.sheets.index(sheet)] = {
+                "range": gdriveFile.a1Range(sheet),
                 "majorDimension": "ROWS",
+                "values": values,
             }
-            self.fileData = (
+        self.setSheetExtents()
+        if self.valueRender == gdriveFile.UNFORMATTED_VALUE:
+            self.cacheDateCols(sheets)
+
+    def sheetRanges(self, sheet, cols, firstRow=None, lastRow=None):
+        """
+        the A1 ranges covering the 0 based columns cols (None for all of
+        them) of the sheet between the given rows, one per run of columns
+        """
+        if cols is None:
+            if firstRow is None or lastRow is not None:
+                return [
+                    gdriveFile.a1Range(
+                        sheet, firstRow=firstRow, lastRow=lastRow
+                    )
+                ]
+            # open ended rows need columns to hang off
+            gridSize = self.sheetMaxSize[self.sheets.index(sheet)]
+            runs = [[0, gridSize["columnCount"] - 1]]
+        else:
+            runs = gdriveFile.columnRuns(cols)
+        return [
+            gdriveFile.a1Range(
+                sheet, first + 1, last + 1, firstRow=firstRow, lastRow=lastRow
+            )
+            for first, last in runs
+        ]
+
+    def fetchRows(
+        self, sheets, cols, valueRender, firstRow=None, lastRow=None
+    ):
+        """
+        fetch the rows between firstRow and lastRow (default all of them)
+        of each named sheet, returning a list of row lists per sheet
+        cols: 0 based column numbers to fetch, None for all of them
+        a single range goes through values().get, otherwise batchGet
+        """
+        rangesPerSheet = [
+            self.sheetRanges(sheet, cols, firstRow, lastRow)
+            for sheet in sheets
+        ]
+        ranges = [r for sheetRanges in rangesPerSheet for r in sheetRanges]
+        params = {
+            "spreadsheetId": self.gdocId,
+            "majorDimension": "ROWS",
+            "valueRenderOption": valueRender,
+        }
+        if valueRender == gdriveFile.UNFORMATTED_VALUE:
+            params.update({"dateTimeRenderOption": "SERIAL_NUMBER"})
+        if len(ranges) == 1:
+            params.update({"range": ranges[0]})
+            rangeList = [
                 self.sheet_service.spreadsheets()
                 .values()
-                .batchGet(**params)
+                .get(**params)
                 .execute()
+            ]
+        else:
+            params.update({"ranges": ranges})
+            rangeList = (
+                self.sheet_service.spreadsheets()
+                .values()
+                .batchGet(**params)
+                .execute()["valueRanges"]
             )
-            self.setSheetExtents()
+        runs = None if cols is None else gdriveFile.columnRuns(cols)
+        rowLists = []
+        n = 0
+        for sheetRanges in rangesPerSheet:
+            perSheet = rangeList[n : n + len(sheetRanges)]
+            n += len(sheetRanges)
+            if runs is not None and len(runs) > 1:
+                # back to one list of rows per sheet
+                rowLists.append(gdriveFile.stitchRanges(perSheet, runs))
+            else:
+                rowLists.append(perSheet[0].get("values", []))
+        return rowLists
+
+    def cacheDateCols(self, sheets):
+        """
+        serial date-times are indistinguishable from other numbers, so ask
+        for the number format of each sheet's second row (the first data
+        row whether or not there is a header) and note the 0 based columns
+        formatted as a DATE or DATE_TIME
+        """
+        resp = (
+            self.sheet_service.spreadsheets()
+            .get(
+                spreadsheetId=self.gdocId,
+                ranges=[
+                    gdriveFile.a1Range(s, firstRow=2, lastRow=2)
+                    for s in sheets
+                ],
+                fields="sheets(data(rowData(values(effectiveFormat(numberFormat(type))))))",
+            )
+            .execute()
+        )
+        for name, s in zip(sheets, resp.get("sheets", [])):
+            cells = []
+            for d in s.get("data", []):
+                for r in d.get("rowData", []):
+                    cells = r.get("values", [])
+            self.dateCols[name] = {
+                n
+                for n, cell in enumerate(cells)
+                if cell.get("effectiveFormat", {})
+                .get("numberFormat", {})
+                .get("type")
+                in ("DATE", "DATE_TIME")
+            }
+
+    def refreshTail(self, sheet=None, overlap=3):
+        """
+        For sheets which only grow at the bottom: fetch the rows after the
+        last one we know about and add them to the cached values, and to
+        the sheet's dataframe if it has been built.
+
+        The last overlap known rows are fetched again alongside; if they
+        don't match what we have, something above the tail has been
+        edited, and the sheet is reloaded in full.
+
+        sheet: defaults to every sheet which has been fetched
+        returns the number of rows added (or -1 for a full reload)
+        """
+        if sheet is None:
+            added = 0
+            for s, entry in zip(self.sheets, self.fileData["valueRanges"]):
+                if entry is not None:
+                    added += max(self.refreshTail(s, overlap), 0)
+            return added
+
+        sheetIndex = self.sheets.index(sheet)
+        entry = self.fileData["valueRanges"][sheetIndex]
+        if entry is None:
+            print(f"refreshTail({sheet}) nothing fetched yet to refresh")
+            return 0
+        if self.fileRows is not None:
+            print(
+                f"refreshTail({sheet}) values are limited to "
+                f"{self.fileRows} rows"
+            )
+            return 0
+        values = entry.setdefault("values", [])
+        known = len(values)
+        overlap = min(overlap, known)
+
+        [rows] = self.fetchRows(
+            [sheet],
+            self.fileCols,
+            self.valueRender,
+            firstRow=known - overlap + 1,
+        )
+        if rows[:overlap] != values[known - overlap :]:
+            print(f"refreshTail({sheet}) rows above the tail changed")
+            self.fileData["valueRanges"][sheetIndex] = None
+            self.cacheSheetData(
+                sheet,
+                valueRender=self.valueRender,
+                usecols=self.fileCols,
+                maxRows=self.fileRows,
+            )
+            if sheet in self.sheetDict:
+                self.rebuildSheet(sheet)
+            return -1
+
+        newRows = rows[overlap:]
+        if len(newRows) == 0:
+            return 0
+        values.extend(newRows)
+        self.setSheetExtents()
+
+        df = self.sheetDict.get(sheet)
+        if df is None:
+            return len(newRows)
+        usecols, maxRows, valueRender = self.sheetOptions[sheet]
+        if maxRows is not None or known == 0 or len(df.columns) == 0:
+            # only some of the new rows may belong in it, or it was built
+            # from an empty sheet and the header is still to be found
+            self.rebuildSheet(sheet)
+            return len(newRows)
+        # the columns the frame was built with
+        if usecols is None:
+            usecols = self.fileCols
+        if usecols is None:
+            usecols = range(len(df.columns))
+        tail = gdriveFile.valuesToDataFrame(
+            newRows,
+            usecols=usecols,
+            name=sheet,
+            valueRender=self.valueRender,
+            dateCols=self.dateCols.get(sheet, ()),
+            colNumbers=self.fileCols,
+            labels=df.columns,
+        )
+        df = pd.concat([df, tail], ignore_index=True)
+        df.name = sheet
+        self.sheetDict.update({sheet: df})
+        self.sheetLen.update({sheet: len(df)})
+        return len(newRows)
+
+    def rebuildSheet(self, sheet):
+        """
+        build the sheet's dataframe again from the cached values, with the
+        options it was built with before
+        """
+        usecols, maxRows, valueRender = self.sheetOptions[sheet]
+        df = self.sheetToDataFrame(
+            self.sheets.index(sheet), usecols=usecols, maxRows=maxRows
+        )
+        self.sheetDict.update({sheet: df})
+
+    def iterRowBlocks(
+        self,
+        sheet,
+        blockRows=5000,
+        usecols=None,
+        valueRender=None,
+        rows=False,
+    ):
+        """
+        Page through a sheet blockRows rows at a time, yielding a dataframe
+        per block, so only one block's values are held in memory however
+        big the sheet.  Nothing is added to the file's caches.
+
+        The header row is looked for in the first block and its labels
+        reused for the rest, which also fixes the columns when usecols
+        isn't given.  The dataframes' index carries on from block to block.
+
+        Paging stops at the first block to come back empty after the last
+        row known to hold data, from the file's cached values or the blocks
+        so far, rather than carrying on to the bottom of the grid, so a gap
+        of blockRows or more empty rows ends the sheet.
+
+        usecols, valueRender: as for toDataFrame
+        rows: True to yield the lists of row values instead
+        """
+        assert self.isSpreadSheet is True
+        self.cacheFileInfo()
+        if valueRender is None:
+            valueRender = gdriveFile.FORMATTED_VALUE
+        cols = None if usecols is None else sorted(set(usecols))
+        if (
+            valueRender == gdriveFile.UNFORMATTED_VALUE
+            and sheet not in self.dateCols
+        ):
+            self.cacheDateCols([sheet])
+        rowCount = self.sheetMaxSize[self.sheets.index(sheet)]["rowCount"]
+        dataEnd = 0  # the last row known to hold data
+        if (
+            self.fileData
+            and self.fileData["valueRanges"][self.sheets.index(sheet)]
+            and self.fileRows is None
+            and (
+                self.fileCols is None
+                or cols is not None
+                and set(cols) <= set(self.fileCols)
+            )
+        ):
+            dataEnd = self.lastRow.get(sheet, 0)
+
+        labels = None
+        blank = 0  # empty rows the api trimmed off the end of earlier blocks
+        nextIndex = 0
+        for firstRow in range(1, rowCount + 1, blockRows):
+            lastRow = min(firstRow + blockRows - 1, rowCount)
+            [block] = self.fetchRows(
+                [sheet], cols, valueRender, firstRow=firstRow, lastRow=lastRow
+            )
+            if len(block) == 0:
+                if firstRow > dataEnd:
+                    return
+                blank += lastRow - firstRow + 1
+                continue
+            dataEnd = max(dataEnd, firstRow + len(block) - 1)
+            missing = lastRow - firstRow + 1 - len(block)
+            block = [[] for n in range(blank)] + block
+            blank = missing
+            if rows:
+                yield block
+                continue
+
+            if labels is None:
+                df = gdriveFile.valuesToDataFrame(
+                    block,
+                    usecols=cols,
+                    name=sheet,
+                    valueRender=valueRender,
+                    dateCols=self.dateCols.get(sheet, ()),
+                    colNumbers=cols,
+                )
+                labels = list(df.columns)
+            else:
+                df = gdriveFile.valuesToDataFrame(
+                    block,
+                    usecols=range(len(labels)) if cols is None else cols,
+                    name=sheet,
+                    valueRender=valueRender,
+                    dateCols=self.dateCols.get(sheet, ()),
+                    colNumbers=cols,
+                    labels=labels,
+                )
+            df.index = range(nextIndex, nextIndex + len(df))
+            nextIndex += len(df)
+            df.name = sheet
+            yield df
 
     def setSheetExtents(self):
         rangeList = self.fileData["valueRanges"]
-        lastCol = []
-        lastRow = []
 
         # print(rangeList)
         assert len(rangeList) == len(self.sheets)  # or problem cos
         # everything I've seen so far, says 1 valueRange per sheet
-        for entry in rangeList:
+        for sheet, entry in zip(self.sheets, rangeList):
+            if entry is None:
+                # not fetched yet
+                continue
             assert entry["majorDimension"] == "ROWS"
             values = entry.get("values", [])
             maxlen = 0
             for row in values:
                 rowlen = len(row)
                 maxlen = max(rowlen, maxlen)
-            lastCol.append(maxlen)
-            lastRow.append(len(values))
-
-        self.lastCol = dict(zip(self.sheets, lastCol))
-        self.lastRow = dict(zip(self.sheets, lastRow))
+            if self.fileCols is not None and maxlen > 0:
+                # only some columns were fetched, map back to the sheet
+                maxlen = self.fileCols[maxlen - 1] + 1
+            self.lastCol[sheet] = maxlen
+            self.lastRow[sheet] = len(values)
 
     def addData(
         self,
@@ -486,7 +1397,8 @@ class gdriveFile:
         dataArray: a list containing a single list of values to enter
         arrayRepresents: defaults to ROW -> the values are for consecutive columns
                                     COLUMN -> the values are for consecutive rows
-        growSheet: False throw an error if data beyond end, True then append 5 rows
+        growSheet: False throw an error if data beyond end, True then grow the
+                   sheet to fit
         """
         if type(startCol) == int:
             startCol = gdriveFile.colnum_string(startCol)
@@ -508,12 +1420,6 @@ class gdriveFile:
             print("invalid sheet specified")
             raise ValueError
 
-        if startRow > (self.sheetMaxSize[sheetIndex]["rowCount"] - 5):
-            if growSheet:
-                self.append5Rows(sheet, sheetIndex)
-            else:
-                raise ValueError
-
         data = gdriveFile.createValueRange(
             startCol,
             startRow,
@@ -521,17 +1427,8 @@ class gdriveFile:
             arrayRepresents=arrayRepresents,
             sheet=sheet,
         )
-
-        params = {
-            "spreadsheetId": self.gdocId,
-            "body": {"data": data, "valueInputOption": "user_entered"},
-        }
-        resp = (
-            self.sheet_service.spreadsheets()
-            .values()
-            .batchUpdate(**params)
-            .execute()
-        )
+        self.fitSheet(data["range"], sheet, growSheet)
+        self.writeValueRanges([data])
 
     def addData2d(
         self,
@@ -549,7 +1446,8 @@ class gdriveFile:
         dataArray: a list containing a single list of values to enter
         arrayRepresents: defaults to ROW -> the values are for consecutive columns
                                     COLUMN -> the values are for consecutive rows
-        growSheet: False throw an error if data beyond end, True then append 5 rows
+        growSheet: False throw an error if data beyond end, True then grow the
+                   sheet to fit
         """
         if type(startCol) == int:
             startCol = gdriveFile.colnum_string(startCol)
@@ -571,132 +1469,614 @@ class gdriveFile:
             print("invalid sheet specified")
             raise ValueError
 
-        if startRow > (self.sheetMaxSize[sheetIndex]["rowCount"] - 5):
+        data = gdriveFile.createValueRange2d(
+            startCol, startRow, dataArray, arrayOf=arrayOf, sheet=sheet
+        )
+        self.fitSheet(data["range"], sheet, growSheet)
+        self.writeValueRanges([data])
+
+    def fitSheet(self, a1, sheet, growSheet):
+        """
+        check the range a1 fits on the sheet, growing it if allowed
+        """
+        lastCol, lastRow = gdriveFile.rangeEnd(a1)
+        gridSize = self.sheetMaxSize[self.sheets.index(sheet)]
+        if (lastRow or 0) > gridSize["rowCount"] or (lastCol or 0) > gridSize[
+            "columnCount"
+        ]:
             if growSheet:
-                self.append5Rows(sheet, sheetIndex)
+                self.growSheetTo(sheet, lastRow, lastCol)
             else:
+                print(f"{a1} is beyond the end of {sheet}, try growSheet")
                 raise ValueError
 
-        data = gdriveFile.createValueRange2d(
-            startCol, startRow, dataArray, arrayOf=arrayOf, sheet=sheet
-        )
+    def growSheetTo(self, sheet, lastRow=None, lastCol=None):
+        """
+        make the sheet at least lastRow rows and lastCol columns (1 based)
+        with appendDimension requests in one spreadsheets().batchUpdate,
+        and keep sheetMaxSize up to date.  Inside a writeSession the
+        request is held back and sent just before the values
+        """
+        sheetIndex = self.sheets.index(sheet)
+        gridSize = self.sheetMaxSize[sheetIndex]
+        sheetProperties = self.fileInfo["sheets"][sheetIndex]["properties"]
+        sheetId = sheetProperties["sheetId"]
+        requests = []
+        for dimension, count, wanted in (
+            ("ROWS", "rowCount", lastRow),
+            ("COLUMNS", "columnCount", lastCol),
+        ):
+            if wanted is not None and wanted > gridSize[count]:
+                requests.append(
+                    {
+                        "appendDimension": {
+                            "sheetId": sheetId,
+                            "dimension": dimension,
+                            "length": wanted - gridSize[count],
+                        }
+                    }
+                )
+                gridSize[count] = wanted
+        if requests:
+            self.sheetRequests(requests)
 
-        params = {
-            "spreadsheetId": self.gdocId,
-            "body": {"data": data, "valueInputOption": "user_entered"},
+    def formatCells(
+        self, sheet, firstCol, lastCol, firstRow, lastRow, numberFormat
+    ):
+        """
+        set the numberFormat, eg {"type": "PERCENT", "pattern": "0.0%"}, of
+        a block of cells with a repeatCell request, columns and rows are 1
+        based.  Numbers stay numbers, the sheet does the formatting
+        """
+        sheetIndex = self.sheets.index(sheet)
+        sheetProperties = self.fileInfo["sheets"][sheetIndex]["properties"]
+        request = {
+            "repeatCell": {
+                "range": {
+                    "sheetId": sheetProperties["sheetId"],
+                    "startRowIndex": firstRow - 1,
+                    "endRowIndex": lastRow,
+                    "startColumnIndex": firstCol - 1,
+                    "endColumnIndex": lastCol,
+                },
+                "cell": {"userEnteredFormat": {"numberFormat": numberFormat}},
+                "fields": "userEnteredFormat.numberFormat",
+            }
         }
+        self.sheetRequests([request])
+
+    def sheetRequests(self, requests):
+        """
+        send spreadsheets().batchUpdate requests (growing, formatting), or
+        inside a writeSession hold them to go in one call before the values
+        """
+        if self.pendingRequests is not None:
+            self.pendingRequests.extend(requests)
+            return
+        self.sendRequests(requests)
+
+    def sendRequests(self, requests):
+        params = {"spreadsheetId": self.gdocId, "body": {"requests": requests}}
         resp = (
-            self.sheet_service.spreadsheets()
-            .values()
-            .batchUpdate(**params)
-            .execute()
+            self.sheet_service.spreadsheets().batchUpdate(**params).execute()
         )
 
-    def append5Rows(self, sheet, sheetIndex):
-        # append at the end of the sheet
-        aP = self.sheetMaxSize[sheetIndex][
-            "rowCount"
-        ]  # append position
-        appendData = gdriveFile.createValueRange(
-            "A",
-            aP,
-            ["" for i in range(5)],
-            arrayRepresents="COLUMN",
-            sheet=sheet,
-        )
+    def undoGrowth(self, requests):
+        """
+        put sheetMaxSize back after held back requests weren't sent
+        """
+        sheetIds = [
+            s["properties"]["sheetId"] for s in self.fileInfo["sheets"]
+        ]
+        for r in requests:
+            if "appendDimension" not in r:
+                continue
+            grow = r["appendDimension"]
+            gridSize = self.sheetMaxSize[sheetIds.index(grow["sheetId"])]
+            count = "rowCount" if grow["dimension"] == "ROWS" else "columnCount"
+            gridSize[count] -= grow["length"]
+
+    def writeValueRanges(self, data):
+        """
+        send a list of value ranges in a values().batchUpdate, or if a
+        writeSession is open, hold on to them to go with the rest
+        """
+        if self.pendingWrites is not None:
+            self.pendingWrites.extend(data)
+            return
+        for chunk in gdriveFile.splitPayload(data, self.writeBytes):
+            params = {
+                "spreadsheetId": self.gdocId,
+                "body": {"data": chunk, "valueInputOption": "user_entered"},
+            }
+            resp = (
+                self.sheet_service.spreadsheets()
+                .values()
+                .batchUpdate(**params)
+                .execute()
+            )
 
-        appendParm = {
-            "spreadsheetId": self.gdocId,
-            "range": "{}!{}{}:{}{}".format(sheet, "A", aP, "A", aP + 4),
-            "body": appendData,
-            "valueInputOption": "USER_ENTERED",  # ['INPUT_VALUE_OPTION_UNSPECIFIED', 'RAW', 'USER_ENTERED']
-            "insertDataOption": "INSERT_ROWS",  # overwrite
-        }
-        print(appendParm)
+    @staticmethod
+    def splitPayload(data, maxBytes):
+        """
+        split a list of value ranges into chunks whose json is roughly
+        no more than maxBytes, a single larger range is cut into slices of
+        rows (see splitValueRange)
+        """
+        chunk = []
+        size = 0
+        for vr in itertools.chain.from_iterable(
+            gdriveFile.splitValueRange(vr, maxBytes) for vr in data
+        ):
+            vrSize = len(json.dumps(vr, default=str))
+            if chunk and size + vrSize > maxBytes:
+                yield chunk
+                chunk = []
+                size = 0
+            chunk.append(vr)
+            size += vrSize
+        if chunk:
+            yield chunk
 
-        resp = (
-            self.sheet_service.spreadsheets()
-            .values()
-            .append(**appendParm)
-            .execute()
+    @staticmethod
+    def splitValueRange(vr, maxBytes):
+        """
+        a ROWS value range whose json is over maxBytes as a list of ranges
+        of consecutive rows, each roughly no more than maxBytes; anything
+        else, or one without its first cell given, as it is
+        """
+        rows = vr.get("values", [])
+        if (
+            vr.get("majorDimension") != "ROWS"
+            or len(rows) < 2
+            or len(json.dumps(vr, default=str)) <= maxBytes
+        ):
+            return [vr]
+        sheet, cells = vr["range"].rsplit("!", 1)
+        firstCol, firstRow = re.match(
+            r"^([A-Z]*)(\d*)$", cells.split(":")[0]
+        ).groups()
+        if not firstCol or not firstRow:
+            return [vr]
+        lastCol, lastRow = gdriveFile.rangeEnd(vr["range"])
+        lastCol = gdriveFile.colnum_string(lastCol) if lastCol else firstCol
+
+        slices = []
+        start = 0
+        size = 0
+        for n, row in enumerate(rows):
+            rowSize = len(json.dumps(row, default=str)) + 1
+            if n > start and size + rowSize > maxBytes:
+                slices.append((start, n))
+                start = n
+                size = 0
+            size += rowSize
+        slices.append((start, len(rows)))
+        return [
+            {
+                "range": "{}!{}{}:{}{}".format(
+                    sheet,
+                    firstCol,
+                    int(firstRow) + start,
+                    lastCol,
+                    int(firstRow) + end - 1,
+                ),
+                "majorDimension": "ROWS",
+                "values": rows[start:end],
+            }
+            for start, end in slices
+        ]
+
+    @contextlib.contextmanager
+    def writeSession(self, maxBytes=None):
+        """
+        collect every addData/addData2d inside the with block and send them
+        together as one values().batchUpdate when it closes, split into
+        several if the payload would pass maxBytes (WRITE_BATCH_BYTES)
+
+        with doc.writeSession():
+            doc.addData("A", 1, ["heading"])
+            doc.addData2d("A", 2, rows)
+
+        Sessions nest, the outermost one does the sending.  Any growing or
+        formatting of the sheets goes first, as one
+        spreadsheets().batchUpdate.  If the block raises, nothing buffered
+        is sent.  Callbacks given to whenSent are called once it all has
+        been
+        """
+        if self.pendingWrites is not None:
+            yield self
+            return
+        self.pendingWrites = []
+        self.pendingRequests = []
+        self.pendingCallbacks = []
+        self.writeBytes = maxBytes or gdriveFile.WRITE_BATCH_BYTES
+        try:
+            try:
+                yield self
+            except BaseException:
+                self.undoGrowth(self.pendingRequests)
+                raise
+            data, requests = self.pendingWrites, self.pendingRequests
+            callbacks = self.pendingCallbacks
+            self.pendingWrites = None
+            self.pendingRequests = None
+            self.pendingCallbacks = None
+            if requests:
+                try:
+                    self.sendRequests(requests)
+                except BaseException:
+                    # the sheets didn't grow after all
+                    self.undoGrowth(requests)
+                    raise
+            self.writeValueRanges(data)
+            for callback in callbacks:
+                callback()
+        finally:
+            self.pendingWrites = None
+            self.pendingRequests = None
+            self.pendingCallbacks = None
+            self.writeBytes = gdriveFile.WRITE_BATCH_BYTES
+
+    def whenSent(self, callback):
+        """
+        call callback() once the writes so far have reached the sheet: when
+        the writeSession closes, or straight away outside one.  It isn't
+        called if the session fails
+        """
+        if self.pendingCallbacks is None:
+            callback()
+        else:
+            self.pendingCallbacks.append(callback)
+
+    def append5Rows(self, sheet, sheetIndex):
+        # kept for old callers, growSheetTo adds exactly what is needed
+        self.growSheetTo(
+            sheet, self.sheetMaxSize[sheetIndex]["rowCount"] + 5
         )
 
-    def toDataFrame(self, usecols=None):
+    def toDataFrame(
+        self,
+        usecols=None,
+        valueRender=None,
+        maxRows=None,
+        lazy=True,
+        diskCache=None,
+        engine="values",
+    ):
         """
-        iterate over the sheets, building a dataframe for each
-        these are stashed into a dictionary
+        return a dictionary like SheetFrames of a dataframe for each sheet
+        a sheet is only fetched and converted when it is first looked up,
+        the dataframes are stashed into self.sheetDict
+
+        usecols: 0 based column numbers, only these are fetched
+        valueRender: see cacheFileData, UNFORMATTED_VALUE gives native
+        int/float/datetime64 columns rather than parsing display strings
+        maxRows: only fetch this many rows (including any header) per sheet
+        lazy: False fetches every sheet in one go, up front
+        diskCache: a frameCache.FrameCache to look sheets up in before
+        fetching them, costing one call to check the file's modifiedTime
+        engine: "values" fetches through the sheets api as json
+                "export" streams each sheet's csv export through pandas' C
+                parser instead, much quicker for big sheets.  The values
+                are the formatted ones, with pandas choosing the dtypes
         """
-        self.cacheFileData()
+        if engine not in ("values", "export"):
+            print(f"unknown engine {engine}")
+            raise ValueError
+        if engine == "export" and valueRender not in (
+            None,
+            gdriveFile.FORMATTED_VALUE,
+        ):
+            print("the export engine only gives formatted values")
+            raise ValueError
+        frames = SheetFrames(
+            self, usecols, valueRender, maxRows, diskCache, engine
+        )
+        if engine == "export":
+            if not lazy:
+                for sheet in frames:
+                    frames[sheet]
+            return frames
+        if not lazy:
+            self.cacheFileData(
+                valueRender=valueRender, usecols=usecols, maxRows=maxRows
+            )
+            for sheet in frames:
+                frames[sheet]
+        return frames
 
-        for n in range(len(self.fileData["valueRanges"])):
-            df = self.sheetToDataFrame(n, usecols=usecols)
-            self.sheetDict.update({df.name: df})
-        return self.sheetDict
+    @staticmethod
+    def convertColumns(columns):
+        """
+        column at a time version of the rule applied to each cell:
+        anything starting with a digit which parses as a float becomes one,
+        everything else is left as the string the api gave us.
 
-    def sheetToDataFrame(self, i, usecols=None):
+        columns: equal length sequences of strings
+        returns a list with a float64 array for each column which wholly
+        converted, and an object array for the rest
         """
-        return a pandas dataframe containing the data, and
-        the number of columns it contains
+        if len(columns) == 0 or len(columns[0]) == 0:
+            return [np.array(c, dtype=object) for c in columns]
+        strings = np.array(columns, dtype=str)
+        # truncating to 1 character leaves just the first one to test
+        mask = np.char.isdigit(strings.astype("<U1"))
+        # anything left after trimming float characters off both ends, like
+        # the '/01/' of a date, can't parse so don't bother trying
+        mask[mask] = np.char.strip(strings[mask], FLOAT_CHARS) == ""
+
+        converted = []
+        for col, colStrings, colMask in zip(columns, strings, mask):
+            if not colMask.any():
+                converted.append(np.array(col, dtype=object))
+                continue
+            try:
+                numbers = colStrings[colMask].astype("float64")
+            except ValueError:
+                # something like '1-2' got through, use a forgiving parse
+                numbers = pd.to_numeric(
+                    pd.Series(colStrings[colMask], dtype=object),
+                    errors="coerce",
+                ).to_numpy(dtype="float64")
+            parsed = ~np.isnan(numbers)  # 'nan' can't start with a digit
+            if colMask.all() and parsed.all():
+                converted.append(numbers)
+                continue
+            out = np.array(col, dtype=object)
+            out[np.flatnonzero(colMask)[parsed]] = numbers[parsed].tolist()
+            converted.append(out)
+        return converted
+
+    @staticmethod
+    def nativeColumns(columns, dateCols=()):
         """
+        the UNFORMATTED_VALUE equivalent of convertColumns: the api has
+        already typed the cells, so just gather them into int64, float64
+        (blanks become NaN), bool or datetime64 columns, leaving anything
+        with strings in it as an object array
 
-        def addrow(row, usecols):
-            tempDict = {}
-            n = 0
-            for y, item in enumerate(row):
-                if usecols is None or y in usecols:
-                    # try converting numbers instead of leaving as string
-                    if len(item) > 0 and item[0].isdigit():
-                        try:
-                            item = float(item)
-                        except:
-                            pass
-                    tempDict.update({y: item})
-                    n += 1
-            for y in range(n, len(usecols)):
-                tempDict.update(
-                    {usecols[y]: ""}
-                )  # add dummy value for wanted cols
-            return (tempDict, n)
+        dateCols: positions in columns holding serial date-times
+        """
+        converted = []
+        for n, col in enumerate(columns):
+            cells = np.array(col, dtype=object)
+            blank = cells == ""
+            kind = pd.api.types.infer_dtype(cells[~blank], skipna=True)
+            if kind in ("integer", "floating", "mixed-integer-float"):
+                if kind == "integer" and not blank.any() and n not in dateCols:
+                    converted.append(cells.astype("int64"))
+                    continue
+                cells[blank] = np.nan
+                numbers = cells.astype("float64")
+                if n in dateCols:
+                    converted.append(
+                        pd.to_datetime(
+                            numbers,
+                            unit="D",
+                            origin=gdriveFile.SERIAL_DATE_ORIGIN,
+                        ).to_numpy()
+                    )
+                else:
+                    converted.append(numbers)
+            elif kind == "boolean" and not blank.any() and len(cells) > 0:
+                converted.append(cells.astype(bool))
+            else:
+                converted.append(cells)
+        return converted
 
-        stuff = []
-        maxcols = 0
+    @staticmethod
+    def convertCell(item):
+        """
+        the single cell equivalent of convertColumns
+        """
+        if isinstance(item, str) and len(item) > 0 and item[0].isdigit():
+            try:
+                return float(item)
+            except ValueError:
+                pass
+        return item
 
-        for n, row in enumerate(
-            self.fileData["valueRanges"][i].get("values", [])
-        ):
-            # print("row({}): {}".format(n,row))
-            (newRow, cols) = addrow(row, usecols)
-            stuff.append(newRow)
-            maxcols = max(maxcols, cols)
+    @staticmethod
+    def valuesToDataFrame(
+        values,
+        usecols=None,
+        name=None,
+        valueRender=None,
+        dateCols=(),
+        colNumbers=None,
+        labels=None,
+    ):
+        """
+        turn the ragged list of row lists from a valueRange into a dataframe
+
+        rows are padded into columns in one go, usecols (0 based column
+        numbers) is applied by picking out those columns, and each column
+        is then converted as a whole.  If the first cell doesn't look like a
+        number the first row is taken as the column labels, with blank
+        labels replaced by the column position.
+
+        valueRender: how values were fetched, UNFORMATTED_VALUE cells are
+        already typed and dateCols (0 based column numbers) are serial
+        date-times
+        colNumbers: the 0 based sheet column of each value in a row, when
+        only some columns were fetched
+        labels: column labels to use rather than looking for a header row,
+        one per column picked out by usecols
+        """
+        if len(values) == 0:
+            print(f"no values, assigning null df for sheet {name}")
+            return pd.DataFrame()
+
+        # zip_longest transposes the ragged rows into padded columns in C
+        allCols = list(itertools.zip_longest(*values, fillvalue=""))
+        if colNumbers is None:
+            colNumbers = range(len(allCols))
+        if usecols is None:
+            cols = list(colNumbers)
+        else:
+            cols = sorted(set(usecols))
+        position = {c: n for n, c in enumerate(colNumbers)}
+        blank = ("",) * len(values)
+        columns = [
+            allCols[position[c]]
+            if position.get(c, len(allCols)) < len(allCols)
+            else blank
+            for c in cols
+        ]
 
         # look at first cell in first row to guess whether the first row
         # contains labels
-        try:
-            if stuff[0][0] == "" or stuff[0][0][0].isdigit():
-                # probably not
-                df = pd.DataFrame(stuff)
-            else:
-                # make sure we have enough labels for all the columns used
-                c = list(stuff[0].values())  # based on first row labels
-                e = []
-                for n in range(maxcols):
-                    if n >= len(c) or not c[n] or c[n] == "":
-                        e.append(n)
-                    else:
-                        e.append(c[n])
-                # print(e)
-                df = pd.DataFrame(stuff[1:])
-                df.columns = e
-        except IndexError:
-            print(
-                f"IndexError. Stuff: {stuff} assigning null df for sheet {self.sheets[i]}"
+        first = columns[0][0] if len(columns) > 0 else ""
+        if labels is not None:
+            # already known, eg from the rows above
+            labels = list(labels)
+        elif first == "" or not isinstance(first, str) or first[0].isdigit():
+            # probably not
+            labels = cols
+        else:
+            labels = [
+                label if label else n
+                for n, label in enumerate(
+                    gdriveFile.convertCell(c[0]) for c in columns
+                )
+            ]
+            columns = [c[1:] for c in columns]
+
+        if valueRender == gdriveFile.UNFORMATTED_VALUE:
+            converted = gdriveFile.nativeColumns(
+                columns, [n for n, c in enumerate(cols) if c in dateCols]
             )
-            df = pd.DataFrame()
+        else:
+            converted = gdriveFile.convertColumns(columns)
+        df = pd.DataFrame(dict(enumerate(converted)))
+        df.columns = labels
+        return df
 
+    def sheetToDataFrame(self, i, usecols=None, maxRows=None):
+        """
+        return a pandas dataframe containing the data from the i'th sheet
+        maxRows: only use the first maxRows rows (including any header), the
+        cached values may have been fetched without a limit
+        """
+        df = gdriveFile.valuesToDataFrame(
+            self.fileData["valueRanges"][i].get("values", [])[:maxRows],
+            usecols=usecols,
+            name=self.sheets[i],
+            valueRender=self.valueRender,
+            dateCols=self.dateCols.get(self.sheets[i], ()),
+            colNumbers=self.fileCols,
+        )
         df.name = self.sheets[i]
         self.sheetLen.update({df.name: len(df)})
         return df
 
+    def exportSheetToDataFrame(self, sheet, usecols=None, maxRows=None):
+        """
+        the toDataFrame(engine="export") version of sheetToDataFrame: the
+        sheet's csv export is read straight off the connection by
+        pd.read_csv, so no json or lists of rows are ever built
+
+        The first row is read off the front first to spot a header the same
+        way valuesToDataFrame does, and to find the export's width, usecols
+        past it giving blank columns; blank cells in text columns are ""
+        """
+        self.cacheFileInfo()
+        sheetIndex = self.sheets.index(sheet)
+        sheetProperties = self.fileInfo["sheets"][sheetIndex]["properties"]
+        access = self.access.forThread()
+        if isinstance(access, AccessPool):
+            # it's charged to drive, so goes with the member drive would use
+            access = access.pick("drive_service")
+        url = gdriveFile.SHEET_CSV_URL.format(
+            self.gdocId, sheetProperties["sheetId"]
+        )
+
+        def fetch():
+            # a fresh token each try, one may have expired while waiting
+            token = access.credentials.get_access_token().access_token
+            request = urllib.request.Request(
+                url, headers={"Authorization": "Bearer " + token}
+            )
+            with urllib.request.urlopen(
+                request, timeout=gdriveFile.EXPORT_TIMEOUT
+            ) as resp:
+                return gdriveFile.csvToDataFrame(resp, usecols, maxRows)
+
+        # paced and retried like the api requests, reading it all included
+        df = access.scheduler.call("drive", fetch, idempotent=True)
+        if df is None:
+            print(f"no values, assigning null df for sheet {sheet}")
+            df = pd.DataFrame()
+        for c in df.select_dtypes(include=["object", "string"]).columns:
+            df[c] = df[c].fillna("")
+        df.name = sheet
+        self.sheetLen.update({sheet: len(df)})
+        return df
+
+    @staticmethod
+    def csvToDataFrame(stream, usecols=None, maxRows=None):
+        """
+        the dataframe of the binary csv stream, spotting a header and
+        applying usecols and maxRows as exportSheetToDataFrame describes,
+        or None if it's empty
+        """
+        firstRow, firstBytes = gdriveFile.readCsvRecord(stream)
+        width = len(firstRow)  # every row of the export is as wide
+        if width == 0:
+            return None
+        if usecols is None:
+            cols = list(range(width))
+        else:
+            cols = sorted(set(usecols))
+        firstRow = firstRow + [""] * (max(cols, default=-1) + 1 - width)
+        first = firstRow[cols[0]] if cols else ""
+        if first == "" or first[0].isdigit():
+            labels = cols
+            # it's data, so goes back on the front
+            stream = io.BufferedReader(PrefixedStream(firstBytes, stream))
+        else:
+            labels = [
+                label if label else n
+                for n, label in enumerate(
+                    gdriveFile.convertCell(firstRow[c]) for c in cols
+                )
+            ]
+            if maxRows is not None:
+                maxRows -= 1
+        inExport = [c for c in cols if c < width]
+        df = pd.read_csv(
+            stream,
+            header=None,
+            usecols=inExport or [0],
+            nrows=maxRows,
+            keep_default_na=False,
+            na_values=[""],
+            engine="c",
+        )
+        for c in cols:
+            if c not in inExport:
+                df[c] = ""  # blank, as the values engine pads them
+        df = df[cols]
+        df.columns = labels
+        return df
+
+    @staticmethod
+    def readCsvRecord(stream):
+        """
+        read the first csv record off the front of the binary stream
+        returns it as a list of strings, and the bytes it took up
+        """
+        lines = []
+
+        def readLines():
+            for line in iter(stream.readline, b""):
+                lines.append(line)
+                yield line.decode("utf-8")
+
+        record = next(csv.reader(readLines()), [])
+        return record, b"".join(lines)
+
     def showFileInfo(self):
         self.cacheFileInfo()
         pp = pprint.PrettyPrinter()
@@ -705,11 +2085,48 @@ class gdriveFile:
         pp.pprint(self.fileInfo)
         print("Title:   {}\nSheets: {}".format(self.title, self.sheets))
 
-    def itersheets(self):
-        for name, vr in zip(self.sheets, self.fileData["valueRanges"]):
-            yield (self.title, name), vr["values"]
+    def forThread(self):
+        """
+        this file on the calling thread's connection (see
+        gdriveAccess.forThread), for fetching from a worker thread
+        """
+        return self.withAccess(self.access.forThread())
+
+    def withAccess(self, access):
+        """
+        this file if it's already on access, otherwise a copy on access
+        sharing the file info but with value caches of its own
+        """
+        if access is self.access:
+            return self
+        doc = copy.copy(self)
+        doc.cacheAccess(access)
+        doc.fileData = None
+        doc.valueRender = None
+        doc.fileCols = None
+        doc.fileRows = None
+        doc.sheetDict = {}
+        doc.sheetOptions = {}
+        doc.sheetLen = {}
+        doc.dateCols = {}
+        doc.pendingWrites = None
+        doc.pendingRequests = None
+        doc.pendingCallbacks = None
+        return doc
+
+    def itersheets(self, sheets=None, blockRows=5000, valueRender=None):
+        """
+        yield ((title, sheet), rows) for each sheet, rows iterates over the
+        sheet's row lists, fetched blockRows at a time as it goes, so a
+        whole sheet is never held in memory
+        """
+        self.cacheFileInfo()
+        for sheet in sheets or self.sheets:
+            blocks = self.iterRowBlocks(
+                sheet, blockRows, valueRender=valueRender, rows=True
+            )
+            yield (self.title, sheet), itertools.chain.from_iterable(blocks)
 
-    #  Untested stuff for CSV
     @staticmethod
     def write_csv(fd, rows, dialect="excel"):
         csvfile = csv.writer(fd, dialect=dialect)
@@ -717,20 +2134,345 @@ class gdriveFile:
 
     def export_csv(
         self,
-        service,
-        docid,
         filename_template="%(title)s : %(sheet)s.csv",
+        sheets=None,
+        maxWorkers=4,
+        blockRows=5000,
+        valueRender=None,
+    ):
+        """
+        write each sheet to its own csv file, several sheets at once
+        see exportMany, returns its (filenames, failures)
+        """
+        if not self.isSpreadSheet:
+            print("object is not a spreadsheet")
+            raise TypeError
+        return gdriveFile.exportMany(
+            [self],
+            filename_template,
+            "csv",
+            sheets=sheets,
+            maxWorkers=maxWorkers,
+            blockRows=blockRows,
+            valueRender=valueRender,
+        )
+
+    def exportFrames(
+        self,
+        filename_template="%(title)s : %(sheet)s.%(format)s",
+        format="parquet",
+        sheets=None,
+        maxWorkers=4,
+        **toDataFrameArgs,
     ):
+        """
+        write the toDataFrame dataframe of each sheet to a parquet or
+        feather file, several sheets at once
+        see exportMany, returns its (filenames, failures)
+        """
         if not self.isSpreadSheet:
             print("object is not a spreadsheet")
-            raise (typeError)
-        for (doc, sheet), rows in self.itersheets(service, docid):
+            raise TypeError
+        return gdriveFile.exportMany(
+            [self],
+            filename_template,
+            format,
+            sheets=sheets,
+            maxWorkers=maxWorkers,
+            **toDataFrameArgs,
+        )
+
+    @staticmethod
+    def exportMany(
+        docs,
+        filename_template="%(title)s : %(sheet)s.%(format)s",
+        format="csv",
+        sheets=None,
+        maxWorkers=4,
+        blockRows=5000,
+        valueRender=None,
+        **toDataFrameArgs,
+    ):
+        """
+        export every sheet (or those named in sheets) of every spreadsheet
+        in docs, as one pool of maxWorkers threads, each on its own
+        connection, so big workbooks and many small ones both keep it busy
+
+        filename_template: % formatted with title, sheet, id and format,
+        any path separators in the names become _
+        format: "csv" streams the rows blockRows at a time straight to the
+                file, valueRender as for toDataFrame
+                "parquet" or "feather" writes the toDataFrame dataframe, with
+                toDataFrameArgs, column labels become strings
+        Each file is written under a temporary name and renamed when done.
+
+        returns (filenames, failures) where failures is a list of
+        (gdriveFile, sheet, exception), each is printed too
+        """
+        if format not in ("csv", "parquet", "feather"):
+            print(f"can't export as {format}")
+            raise ValueError
+        if format == "csv" and toDataFrameArgs:
+            print(f"csv export doesn't take {list(toDataFrameArgs)}")
+            raise ValueError
+        tasks = []
+        for doc in docs:
+            doc.cacheFileInfo()
+            for sheet in sheets or doc.sheets:
+                if sheet in doc.sheets:
+                    tasks.append((doc, sheet))
+
+        def export(doc, sheet):
+            doc = doc.forThread()
             filename = filename_template % {
-                "title": doc,
-                "sheet": sheet,
+                "title": doc.title.replace(os.sep, "_"),
+                "sheet": sheet.replace(os.sep, "_"),
+                "id": doc.gdocId,
+                "format": format,
             }
-            with open(filename, "w", newline="") as fd:
-                self.write_csv(fd, rows)
+            partName = filename + ".part"
+            try:
+                if format == "csv":
+                    [(name, rows)] = doc.itersheets(
+                        [sheet], blockRows, valueRender
+                    )
+                    with open(partName, "w", newline="") as fd:
+                        gdriveFile.write_csv(fd, rows)
+                else:
+                    df = doc.toDataFrame(**toDataFrameArgs)[sheet]
+                    df = gdriveFile.arrowFriendly(df)
+                    if format == "parquet":
+                        df.to_parquet(partName)
+                    else:
+                        df.reset_index(drop=True).to_feather(partName)
+                os.replace(partName, filename)
+            finally:
+                if os.path.exists(partName):
+                    os.remove(partName)
+            return filename
+
+        filenames = []
+        failures = []
+        with concurrent.futures.ThreadPoolExecutor(maxWorkers) as pool:
+            futures = {pool.submit(export, *task): task for task in tasks}
+            for future in concurrent.futures.as_completed(futures):
+                doc, sheet = futures[future]
+                try:
+                    filenames.append(future.result())
+                except Exception as e:
+                    print(f"export of {doc.gdocId} {sheet} failed: {e!r}")
+                    failures.append((doc, sheet, e))
+        return filenames, failures
+
+    @staticmethod
+    def arrowFriendly(df):
+        """
+        a copy of df which parquet and feather can store: string column
+        labels, and no object columns mixing numbers with the "" of blank
+        cells (or with text), which arrow can't give a type.  Blanks in
+        otherwise numeric columns become NaN, anything else mixed becomes
+        strings
+        """
+        df = df.set_axis([str(c) for c in df.columns], axis=1)
+        for c in df.columns[df.dtypes == object]:
+            cells = df[c].to_numpy()
+            blank = cells == ""
+            kind = pd.api.types.infer_dtype(cells[~blank], skipna=True)
+            if kind in ("string", "empty"):
+                continue
+            if kind in ("integer", "floating", "mixed-integer-float"):
+                df[c] = pd.to_numeric(df[c].where(~blank), errors="coerce")
+            else:
+                df[c] = df[c].where(df[c].isna(), df[c].astype(str))
+        return df
+
+
+class PrefixedStream(io.RawIOBase):
+    """
+    prefix's bytes followed by the rest of stream, to put back something
+    read off its front
+    """
+
+    def __init__(self, prefix, stream):
+        self.prefix = prefix
+        self.stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.prefix:
+            n = min(len(buffer), len(self.prefix))
+            buffer[:n] = self.prefix[:n]
+            self.prefix = self.prefix[n:]
+            return n
+        return self.stream.readinto(buffer)
+
+
+class SheetFrames(collections.abc.Mapping):
+    """
+    The sheet name to dataframe mapping returned by gdriveFile.toDataFrame
+    Each sheet's values are fetched with a single request the first time
+    it is looked up, and the dataframe is kept in the file's sheetDict,
+    to be reused by lookups with the same options.
+    Iterating covers every sheet, fetching as it goes.
+    With a diskCache, sheets are looked for there before being fetched, and
+    saved there after
+    """
+
+    def __init__(
+        self,
+        doc,
+        usecols=None,
+        valueRender=None,
+        maxRows=None,
+        diskCache=None,
+        engine="values",
+    ):
+        doc.cacheFileInfo()  # for the sheet names
+        self.doc = doc
+        self.usecols = usecols
+        self.cols = None if usecols is None else tuple(sorted(set(usecols)))
+        self.valueRender = valueRender or gdriveFile.FORMATTED_VALUE
+        self.maxRows = maxRows
+        self.diskCache = diskCache
+        self.engine = engine
+        # the export engine's frames are kept here, not in doc.sheetDict
+        # which goes with the fetched values
+        self.exported = {}
+        if diskCache is not None:
+            self.version = doc.getModifiedTime()
+
+    def cacheKey(self, sheet):
+        return self.diskCache.makeKey(
+            self.doc.gdocId,
+            sheet,
+            self.version,
+            usecols=None if self.cols is None else list(self.cols),
+            valueRender=self.valueRender,
+            maxRows=self.maxRows,
+            engine=self.engine,
+        )
+
+    def __getitem__(self, sheet):
+        if sheet not in self.doc.sheets:
+            raise KeyError(sheet)
+        if self.engine == "export":
+            return self.exportedFrame(sheet)
+        # the file may be shared, and its frame built for another caller's
+        # options, so it's only reused when they're the same as ours
+        options = (self.cols, self.maxRows, self.valueRender)
+        if (
+            sheet in self.doc.sheetDict
+            and self.doc.sheetOptions.get(sheet) == options
+        ):
+            return self.doc.sheetDict[sheet]
+        if self.diskCache is not None:
+            df = self.diskCache.load(self.cacheKey(sheet))
+            if df is not None:
+                df.name = sheet
+                self.doc.sheetDict.update({sheet: df})
+                self.doc.sheetOptions.update({sheet: options})
+                self.doc.sheetLen.update({sheet: len(df)})
+                return df
+        self.doc.cacheSheetData(
+            sheet,
+            valueRender=self.valueRender,
+            usecols=self.usecols,
+            maxRows=self.maxRows,
+        )
+        df = self.doc.sheetToDataFrame(
+            self.doc.sheets.index(sheet),
+            usecols=self.usecols,
+            maxRows=self.maxRows,
+        )
+        self.doc.sheetDict.update({sheet: df})
+        self.doc.sheetOptions.update({sheet: options})
+        if self.diskCache is not None:
+            self.diskCache.save(self.cacheKey(sheet), df)
+        return df
+
+    def exportedFrame(self, sheet):
+        if sheet in self.exported:
+            return self.exported[sheet]
+        df = None
+        if self.diskCache is not None:
+            df = self.diskCache.load(self.cacheKey(sheet))
+        if df is not None:
+            df.name = sheet
+            self.doc.sheetLen.update({sheet: len(df)})
+        else:
+            df = self.doc.exportSheetToDataFrame(
+                sheet, usecols=self.usecols, maxRows=self.maxRows
+            )
+            if self.diskCache is not None:
+                self.diskCache.save(self.cacheKey(sheet), df)
+        self.exported.update({sheet: df})
+        return df
+
+    def __contains__(self, sheet):
+        # without fetching anything
+        return sheet in self.doc.sheets
+
+    def __iter__(self):
+        return iter(list(self.doc.sheets))
+
+    def __len__(self):
+        return len(self.doc.sheets)
+
+    def __repr__(self):
+        if self.engine == "export":
+            loaded = self.exported
+        else:
+            loaded = self.doc.sheetDict
+        return "SheetFrames({}: {} of {} sheets loaded)".format(
+            self.doc.title, len(loaded), len(self.doc.sheets)
+        )
+
+
+class SharedTokenStorage(oauth2client.file.Storage):
+    """
+    The token file, shared safely by every process using it.  Reading,
+    refreshing and writing the token all happen holding an flock on
+    token.json.lock, and oauth2client's refresh first looks in the file,
+    so when many processes find the token expired only the first to get
+    the lock asks google for a new one, the rest pick it up from the file.
+    The file is replaced in one go, never left half written.
+    """
+
+    def __init__(self, filename):
+        super().__init__(filename)
+        self.lockFilename = filename + ".lock"
+        self.lockFd = None
+
+    def acquire_lock(self):
+        super().acquire_lock()
+        if fcntl is not None:
+            self.lockFd = os.open(
+                self.lockFilename, os.O_RDWR | os.O_CREAT, 0o600
+            )
+            fcntl.flock(self.lockFd, fcntl.LOCK_EX)
+
+    def release_lock(self):
+        if self.lockFd is not None:
+            fcntl.flock(self.lockFd, fcntl.LOCK_UN)
+            os.close(self.lockFd)
+            self.lockFd = None
+        super().release_lock()
+
+    def locked_put(self, credentials):
+        # mkstemp makes the file private, like oauth2client's own
+        fd, tmpPath = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(self._filename)),
+            suffix=".tmp",
+        )
+        try:
+            with os.fdopen(fd, "w") as tmp:
+                tmp.write(credentials.to_json())
+            os.replace(tmpPath, self._filename)
+        finally:
+            if os.path.exists(tmpPath):
+                os.remove(tmpPath)
 
 
 class gdriveAccess:
@@ -756,38 +2498,163 @@ class gdriveAccess:
     TOKENFILE = os.path.join(os.path.dirname(__file__), "token.json")
     CREDFILE = os.path.join(os.path.dirname(__file__), "client_id.json")
 
-    def __init__(self):
-        # we have a cached oauth token
-        credStore = oauth2client.file.Storage(gdriveAccess.TOKENFILE)
-        creds = credStore.get()
-        # but if it doesn't exist, we need to request a new one, passing the
-        # application's credentials and requested priviledges
-        # This potentially opens a browser dialog to grant permission
-        if not creds or creds.invalid:
-            flow = oauth2client.client.flow_from_clientsecrets(
-                gdriveAccess.CREDFILE, gdriveAccess.SCOPE
+    # attribute -> (api, version), each built the first time it's used
+    SERVICES = {
+        "drive_service": ("drive", "v3"),
+        "sheet_service": ("sheets", "v4"),
+        "docs_service": ("docs", "v1"),
+    }
+    # where discovery documents are kept, for clients without bundled ones
+    DISCOVERY_DIR = os.path.join(
+        os.path.expanduser("~"), ".cache", "gdriveAccess"
+    )
+    DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/{}/{}/rest"
+    DISCOVERY_MAX_AGE = 7 * 24 * 3600  # seconds before fetching again
+    # refresh the token this many seconds before it expires, less up to
+    # REFRESH_JITTER so processes started together don't all try at once
+    REFRESH_MARGIN = 300
+    REFRESH_JITTER = 60
+    # paces and retries the requests of every service, process wide
+    SCHEDULER = requestScheduler.RequestScheduler()
+
+    def __init__(self, refreshEarly=True, credentials=None, scheduler=None):
+        """
+        refreshEarly: keep the token fresh from a background timer, shortly
+        before it expires, rather than on the request which finds it
+        expired; all the processes sharing TOKENFILE benefit
+        credentials: use these rather than the token in TOKENFILE, eg
+        gdriveAccess.serviceAccount(keyFile)
+        scheduler: a RequestScheduler for credentials with a quota of
+        their own, otherwise the shared SCHEDULER
+        """
+        if credentials is None:
+            credentials = maybeInvokeAuthDialog()
+        self.credentials = credentials
+        self.scheduler = scheduler or gdriveAccess.SCHEDULER
+        self.buildServices()
+        self.ownerThread = threading.current_thread()
+        self.threadAccess = threading.local()
+        self.refreshTimer = None
+        if refreshEarly:
+            self.refreshToken()
+
+    @staticmethod
+    def serviceAccount(keyFile):
+        """
+        credentials from a service account's json key file
+        """
+        return ServiceAccountCredentials.from_json_keyfile_name(
+            keyFile, gdriveAccess.SCOPE
+        )
+
+    def refreshToken(self):
+        """
+        refresh the token if it expires within REFRESH_MARGIN, (if another
+        process already has, that's read from the file instead) then set
+        a timer to come back shortly before the new one expires
+        """
+        creds = self.credentials
+        left = gdriveAccess.tokenSecondsLeft(creds)
+        if left is not None and left < gdriveAccess.REFRESH_MARGIN:
+            try:
+                creds.refresh(httplib2.Http())
+            except Exception as e:
+                print(f"token refresh failed, trying again soon: {e}")
+                self.scheduleRefresh(gdriveAccess.REFRESH_JITTER)
+                return
+            left = gdriveAccess.tokenSecondsLeft(creds)
+        if left is not None:
+            self.scheduleRefresh(
+                left
+                - gdriveAccess.REFRESH_MARGIN
+                + random.uniform(0, gdriveAccess.REFRESH_JITTER)
             )
-            creds = oauth2client.tools.run_flow(flow, credStore)
 
-        self.credentials = creds
-        # create an application end point for interaction with google drive
-        # cache_discovery=False added 25/2/22 to remove logging warning about
-        #  file_cache only supported with client < 4.0.0
-        self.drive_service = apiclient.discovery.build(
-            "drive", "v3", credentials=creds, cache_discovery=False
+    @staticmethod
+    def tokenSecondsLeft(creds):
+        if creds.token_expiry is None:
+            return None
+        # oauth2client keeps the expiry as naive utc
+        now = datetime.datetime.now(datetime.timezone.utc).replace(
+            tzinfo=None
         )
-        # and another for the sheets API used for pulling out different tabs
-        # and data
-        self.sheet_service = apiclient.discovery.build(
-            "sheets",
-            version="v4",
-            credentials=creds,
-            cache_discovery=False,
+        return (creds.token_expiry - now).total_seconds()
+
+    def scheduleRefresh(self, delay):
+        self.refreshTimer = threading.Timer(max(delay, 1), self.refreshToken)
+        self.refreshTimer.daemon = True
+        self.refreshTimer.start()
+
+    def buildServices(self):
+        """
+        forget any services, they are built again as they're used
+        """
+        self.services = {}
+
+    def __getattr__(self, name):
+        # only called for attributes not found the normal way, so this is
+        # how drive_service, sheet_service and docs_service appear
+        if name not in gdriveAccess.SERVICES or "services" not in vars(self):
+            raise AttributeError(name)
+        if name not in self.services:
+            self.services[name] = self.buildService(
+                *gdriveAccess.SERVICES[name]
+            )
+        return self.services[name]
+
+    def buildService(self, api, version):
+        """
+        build an api end point without fetching its discovery document:
+        the copy bundled with the client library is used, or with older
+        clients which don't have one, a copy kept in DISCOVERY_DIR
+        """
+        try:
+            return apiclient.discovery.build(
+                api,
+                version,
+                credentials=self.credentials,
+                cache_discovery=False,
+                static_discovery=True,
+                requestBuilder=self.scheduler.requestBuilder,
+            )
+        except (TypeError, apiclient.errors.UnknownApiNameOrVersion):
+            # no static_discovery before 2.0, or not bundled
+            pass
+        return apiclient.discovery.build_from_document(
+            gdriveAccess.discoveryDocument(api, version),
+            credentials=self.credentials,
+            requestBuilder=self.scheduler.requestBuilder,
         )
 
-        self.docs_service = apiclient.discovery.build(
-            "docs", "v1", credentials=creds, cache_discovery=False
+    @staticmethod
+    def discoveryDocument(api, version):
+        """
+        the api's discovery document, from disk unless it's missing or more
+        than DISCOVERY_MAX_AGE old
+        """
+        path = os.path.join(
+            gdriveAccess.DISCOVERY_DIR, "{}.{}.json".format(api, version)
         )
+        try:
+            if time.time() - os.path.getmtime(path) < (
+                gdriveAccess.DISCOVERY_MAX_AGE
+            ):
+                with open(path) as fd:
+                    return fd.read()
+        except OSError:
+            pass
+        url = gdriveAccess.DISCOVERY_URL.format(api, version)
+        with urllib.request.urlopen(url) as resp:
+            document = resp.read().decode("utf-8")
+        json.loads(document)  # don't keep an error page
+        os.makedirs(gdriveAccess.DISCOVERY_DIR, exist_ok=True)
+        fd, tmpPath = tempfile.mkstemp(
+            dir=gdriveAccess.DISCOVERY_DIR, suffix=".tmp"
+        )
+        with os.fdopen(fd, "w") as tmp:
+            tmp.write(document)
+        os.replace(tmpPath, path)
+        return document
 
     def __enter__(self):
         """
@@ -798,9 +2665,124 @@ class gdriveAccess:
 
     def __exit__(self, *args):
         """
-        enable resource manager function
+        enable resource manager function, stops the refresh timer
+        """
+        if getattr(self, "refreshTimer", None) is not None:
+            self.refreshTimer.cancel()
+            self.refreshTimer = None
+
+    def forThread(self):
+        """
+        the service objects share one httplib2 connection, which isn't
+        thread safe, so any thread other than the one which created this
+        access gets its own copy, with its own services and connections
+        built on the same credentials
+        """
+        if threading.current_thread() is self.ownerThread:
+            return self
+        access = getattr(self.threadAccess, "access", None)
+        if access is None:
+            access = self.__class__.__new__(self.__class__)
+            access.credentials = self.credentials
+            access.scheduler = self.scheduler
+            access.buildServices()
+            access.ownerThread = threading.current_thread()
+            access.threadAccess = threading.local()
+            self.threadAccess.access = access
+        return access
+
+    def get_drive_service(self):
+        return self.drive_service
+
+    def get_sheet_service(self):
+        return self.sheet_service
+
+
+class AccessPool(object):
+    """
+    Several sets of credentials, eg service accounts the same files are
+    shared with, used together to get more than one user's quota.  It
+    can be used anywhere a gdriveAccess can:
+
+    pool = AccessPool.fromServiceAccounts(["robot1.json", "robot2.json"])
+    gdoc = gdriveFile.gdfFromId(fid, pool)
+
+    Each request goes to whichever credentials are least busy, taking
+    turns when they're equal, and those whose api has been rate limited
+    recently are avoided until it passes.  Every member gets a
+    RequestScheduler of its own, as each has its own quota.
+    """
+
+    def __init__(self, accesses):
+        self.accesses = list(accesses)
+        if not self.accesses:
+            print("an AccessPool needs at least one gdriveAccess")
+            raise ValueError
+        for access in self.accesses:
+            if access.scheduler is gdriveAccess.SCHEDULER:
+                access.scheduler = requestScheduler.RequestScheduler()
+                access.buildServices()
+        self.turn = itertools.count()
+        self.ownerThread = threading.current_thread()
+        self.threadAccess = threading.local()
+        self.drive_service = PoolService(self, "drive_service")
+        self.sheet_service = PoolService(self, "sheet_service")
+        self.docs_service = PoolService(self, "docs_service")
+
+    @classmethod
+    def fromServiceAccounts(cls, keyFiles):
+        return cls(
+            gdriveAccess(
+                refreshEarly=False,
+                credentials=gdriveAccess.serviceAccount(keyFile),
+            )
+            for keyFile in keyFiles
+        )
+
+    def pick(self, service="sheet_service"):
+        """
+        the member to send the next request for service to
         """
-        pass
+        api = gdriveAccess.SERVICES[service][0]
+        buckets = [
+            b
+            for b in requestScheduler.RequestScheduler.RATES
+            if b.startswith(api)
+        ]
+        turn = next(self.turn)
+        n = len(self.accesses)
+        inTurn = [self.accesses[(turn + i) % n] for i in range(n)]
+        return min(
+            inTurn,
+            key=lambda access: (
+                access.scheduler.throttledFor(buckets),
+                access.scheduler.inFlight,
+            ),
+        )
+
+    @property
+    def credentials(self):
+        return self.pick().credentials
+
+    def forThread(self):
+        """
+        as gdriveAccess.forThread, a pool of the members' copies for the
+        calling thread
+        """
+        if threading.current_thread() is self.ownerThread:
+            return self
+        pool = getattr(self.threadAccess, "pool", None)
+        if pool is None:
+            pool = AccessPool([a.forThread() for a in self.accesses])
+            self.threadAccess.pool = pool
+        return pool
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        for access in self.accesses:
+            access.__exit__(*args)
 
     def get_drive_service(self):
         return self.drive_service
@@ -809,13 +2791,27 @@ class gdriveAccess:
         return self.sheet_service
 
 
+class PoolService(object):
+    """
+    Stands in for one of the services of an AccessPool's members, each
+    request built through it goes to the member pick() chooses
+    """
+
+    def __init__(self, pool, name):
+        self.pool = pool
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(getattr(self.pool.pick(self.name), self.name), attr)
+
+
 def maybeInvokeAuthDialog():
     # When scope updated, delete the token.json token file and run
     #
     # python -m gdriveFile
     #
-    # we have a cached oauth token
-    credStore = oauth2client.file.Storage(gdriveAccess.TOKENFILE)
+    # we have a cached oauth token, shared with any other processes
+    credStore = SharedTokenStorage(gdriveAccess.TOKENFILE)
     creds = credStore.get()
     # but if it doesn't exist, we need to request a new one, passing the
     # application's credentials and requested priviledges
@@ -825,6 +2821,7 @@ def maybeInvokeAuthDialog():
             gdriveAccess.CREDFILE, gdriveAccess.SCOPE
         )
         creds = oauth2client.tools.run_flow(flow, credStore)
+    return creds
 
 
 def main(args):
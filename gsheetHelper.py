@@ -24,8 +24,11 @@
 
 
 import gdriveFile as gdf
+import concurrent.futures
+import numpy as np
 import pandas as pd
 import re
+import time
 
 
 class GSheetHelper(gdf.gdriveFile):
@@ -88,62 +91,191 @@ class GSheetHelper(gdf.gdriveFile):
     def publishDF(self, df, startRow=2, resultsSheet=None, growSheet=False):
         if resultsSheet is None:
             resultsSheet = GSheetHelper.RESULTS_SHEET
-        # First the 'frame'
-        if type(df.index) == pd.pandas.core.indexes.multi.MultiIndex:
+        # index, headings and values all go in one batchUpdate
+        with self.writeSession():
+            # First the 'frame'
+            if type(df.index) == pd.pandas.core.indexes.multi.MultiIndex:
+                self.addData2d(
+                    "A",
+                    startRow + 1,
+                    [list(i) for i in list(df.index)],
+                    arrayOf="ROW",
+                    sheet=resultsSheet,
+                    growSheet=growSheet,
+                )
+                firstColOffset = 1
+            else:
+                self.addData(
+                    "A",
+                    startRow + 1,
+                    list(df.index),
+                    arrayRepresents="COLUMN",
+                    sheet=resultsSheet,
+                    growSheet=growSheet,
+                )
+                firstColOffset = 0
+
+            self.addData(
+                2 + firstColOffset,
+                startRow,
+                list(df.columns),
+                arrayRepresents="ROW",
+                sheet=resultsSheet,
+                growSheet=growSheet,
+            )
+
+            # Then we start data in Column B = 2, but enumerate index is 0 based
+            # The matrix of values turned into a list of rowlists
+            m = df.values.tolist()
             self.addData2d(
-                "A",
+                2 + firstColOffset,
                 startRow + 1,
-                [list(i) for i in list(df.index)],
+                m,
                 arrayOf="ROW",
                 sheet=resultsSheet,
                 growSheet=growSheet,
             )
+
+    def publishBulk(
+        self,
+        df,
+        startRow=2,
+        resultsSheet=None,
+        growSheet=False,
+        blockCells=50000,
+        maxWorkers=4,
+    ):
+        """
+        publishDF for big frames: the values are taken as one numpy array,
+        so the shape needs no checking row by row, and sent in blocks of
+        rows of about blockCells cells each, maxWorkers blocks at a time,
+        each thread with its own connection.  The index and headings go
+        first, in one request.  Keep maxWorkers modest, the blocks all
+        count against the same write quota.
+
+        returns (cells, seconds) and prints the throughput
+        """
+        if resultsSheet is None:
+            resultsSheet = GSheetHelper.RESULTS_SHEET
+        values = df.to_numpy(dtype=object, copy=True)
+        values[pd.isna(values)] = ""  # no NaN in json
+        nRows, width = values.shape
+        if type(df.index) == pd.pandas.core.indexes.multi.MultiIndex:
             firstColOffset = 1
         else:
+            firstColOffset = 0
+        firstCol = 2 + firstColOffset
+
+        # the frame in one request, growing the sheet if needed
+        with self.writeSession():
             self.addData(
-                "A",
-                startRow + 1,
-                list(df.index),
-                arrayRepresents="COLUMN",
+                firstCol,
+                startRow,
+                list(df.columns),
+                arrayRepresents="ROW",
                 sheet=resultsSheet,
+                growSheet=growSheet,
             )
-            firstColOffset = 0
+            if firstColOffset:
+                self.addData2d(
+                    "A",
+                    startRow + 1,
+                    [list(i) for i in list(df.index)],
+                    arrayOf="ROW",
+                    sheet=resultsSheet,
+                    growSheet=growSheet,
+                )
+            else:
+                self.addData(
+                    "A",
+                    startRow + 1,
+                    list(df.index),
+                    arrayRepresents="COLUMN",
+                    sheet=resultsSheet,
+                    growSheet=growSheet,
+                )
 
-        self.addData(
-            2 + firstColOffset,
-            startRow,
-            list(df.columns),
-            arrayRepresents="ROW",
-            sheet=resultsSheet,
-            growSheet=growSheet,
-        )
+        blockRows = max(1, blockCells // max(width, 1))
+        blocks = [
+            (first, values[first : first + blockRows].tolist())
+            for first in range(0, nRows, blockRows)
+        ]
 
-        # Then we start data in Column B = 2, but enumerate index is 0 based
-        m = df.values.tolist()  # The matrix of values turned into a list of rowlists
-        self.addData2d(
-            2 + firstColOffset,
-            startRow + 1,
-            m,
-            arrayOf="ROW",
-            sheet=resultsSheet,
-            growSheet=growSheet,
+        def upload(block):
+            first, rows = block
+            access = self.access.forThread()
+            params = {
+                "spreadsheetId": self.gdocId,
+                "body": {
+                    "data": [
+                        {
+                            "range": gdf.gdriveFile.a1Range(
+                                resultsSheet,
+                                firstCol,
+                                firstCol + width - 1,
+                                firstRow=startRow + 1 + first,
+                                lastRow=startRow + first + len(rows),
+                            ),
+                            "majorDimension": "ROWS",
+                            "values": rows,
+                        }
+                    ],
+                    "valueInputOption": "user_entered",
+                },
+            }
+            access.sheet_service.spreadsheets().values().batchUpdate(**params).execute()
+            return len(rows) * width
+
+        start = time.monotonic()
+        cells = 0
+        if width > 0:
+            with concurrent.futures.ThreadPoolExecutor(maxWorkers) as pool:
+                for sent in pool.map(upload, blocks):
+                    cells += sent
+        seconds = time.monotonic() - start
+        print(
+            f"publishBulk: {cells} cells in {len(blocks)} blocks "
+            f"in {seconds:.1f}s, {cells / max(seconds, 1e-6):.0f} cells/s"
         )
+        return cells, seconds
 
 
 class GSheetPublisher(object):
     """
     This class defines a publisher for a dataframe.
     There is a mapping from df column names to sheet column titles
-    There is a dictionary of formatters to apply to named columns
+    There is a dictionary of formatters to apply to named columns, either
+    per cell, or vectorized Series -> Series for the whole column
+    There is a dictionary of number formats the sheet applies to named
+    columns, so the values go up as numbers
+    With writeData(diff=True) only the cells which differ from the last
+    published grid are sent
     """
 
     CELL_NAME_PATTERN = re.compile("(\w+)(\d+)")
 
+    # shorthands for addNumberFormat, see
+    # https://developers.google.com/sheets/api/guides/formats
+    NUMBER_FORMATS = {
+        "number": {"type": "NUMBER", "pattern": "#,##0.00"},
+        "integer": {"type": "NUMBER", "pattern": "#,##0"},
+        "currency": {"type": "CURRENCY"},  # the spreadsheet's locale
+        "percent": {"type": "PERCENT", "pattern": "0.0%"},
+        "date": {"type": "DATE", "pattern": "yyyy-mm-dd"},
+        "datetime": {"type": "DATE_TIME", "pattern": "yyyy-mm-dd hh:mm:ss"},
+        "time": {"type": "TIME", "pattern": "hh:mm:ss"},
+    }
+    DATE_TYPES = ("DATE", "DATE_TIME", "TIME")
+
     def __init__(self, df: pd.DataFrame):
         self.dataFrame = df
         self.formatters = {}
+        self.columnFormatters = {}
+        self.numberFormats = {}
         self.columns = {}
         self.doc = None
+        self.lastPublished = None
+        self.formatsPublished = None
 
     def writeLocation(self, doc, sheet, cell):
         """
@@ -160,25 +292,194 @@ class GSheetPublisher(object):
             raise ValueError
         else:
             self.sheet = sheet
+            self.lastPublished = None  # a new location has new contents
+            self.formatsPublished = None
             self.row = int(match[2])
             self.column = match[1]
             self.colNum = gdf.gdriveFile.string_colnum(self.column)
 
-    def writeData(self):
+    def writeData(self, diff=False):
+        """
+        diff: only send the rectangular blocks of cells which have changed
+        since the last diff publish; the first time, the target range is
+        read back once to compare against
+        """
         if self.doc is None:
             print("No location for writer: use writeLocation() first")
+        # values, growing and number formats all go when the session closes
+        with self.doc.writeSession():
+            if diff:
+                self.writeDiff()
+            else:
+                self.writeFrame()
+            if not diff or self.formatsPublished != self.formatLayout():
+                self.writeNumberFormats()
+
+    def formatLayout(self):
+        """
+        what the number formats sent depend on: rows added or columns moved
+        need them sending again
+        """
+        df = self.dataFrame
+        return dict(self.numberFormats), list(df.columns), len(df)
+
+    def writeNumberFormats(self):
+        """
+        a repeatCell for the data rows of every column with a number format
+        """
+        df = self.dataFrame
+        firstCol = self.colNum + df.index.nlevels
+        if len(df):
+            for i, dfColname in enumerate(df.columns):
+                numberFormat = self.numberFormats.get(dfColname)
+                if numberFormat is not None:
+                    self.doc.formatCells(
+                        self.sheet,
+                        firstCol + i,
+                        firstCol + i,
+                        self.row + 1,
+                        self.row + len(df),
+                        numberFormat,
+                    )
+        layout = self.formatLayout()
+        self.formatsPublished = None
+
+        def sent():
+            self.formatsPublished = layout
+
+        self.doc.whenSent(sent)
+
+    def buildGrid(self):
+        """
+        The block of cells writeData fills, as a list of rows: the column
+        headings, then each index entry followed by its rendered data.
+        The corner above the index is None, it's never written
+        """
+        df = self.dataFrame
+        if type(df.index) == pd.pandas.core.indexes.multi.MultiIndex:
+            index = [list(i) for i in list(df.index)]
+        else:
+            index = [[i] for i in list(df.index)]
+        grid = [[None] * df.index.nlevels + list(df.columns)]
+        for rowIndex, row in zip(index, self.renderData()):
+            grid.append(rowIndex + row)
+        return grid
+
+    def readGrid(self, height, width):
+        """
+        what is in the sheet at the publishing location now
+        """
+        [rows] = self.doc.fetchRows(
+            [self.sheet],
+            list(range(self.colNum - 1, self.colNum - 1 + width)),
+            gdf.gdriveFile.UNFORMATTED_VALUE,
+            firstRow=self.row,
+            lastRow=self.row + height - 1,
+        )
+        return rows
+
+    @staticmethod
+    def changedBlocks(old, new):
+        """
+        Compare two grids (lists of rows) and return the cells of new which
+        differ from old as (top, left, rows) rectangles, 0 based.  Cells of
+        old beyond the end of new are blanked.  Changed cells in each row
+        are gathered into runs, and runs spanning the same columns in
+        consecutive rows are merged, so appended rows make one block.
+        None in new means leave that cell alone
+        """
+
+        def cell(grid, r, c):
+            if r < len(grid) and c < len(grid[r]):
+                return grid[r][c]
+            return ""
+
+        blocks = []
+        openBlocks = {}  # (left, right) -> block still growing downwards
+        for r in range(max(len(old), len(new))):
+            width = max(
+                len(old[r]) if r < len(old) else 0,
+                len(new[r]) if r < len(new) else 0,
+            )
+            runs = []
+            for c in range(width):
+                value = cell(new, r, c)
+                if value is None or value == cell(old, r, c):
+                    continue
+                if runs and runs[-1][1] == c - 1:
+                    runs[-1][1] = c
+                else:
+                    runs.append([c, c])
+            stillOpen = {}
+            for left, right in runs:
+                values = [cell(new, r, c) for c in range(left, right + 1)]
+                block = openBlocks.get((left, right))
+                if block is None:
+                    block = (r, left, [])
+                    blocks.append(block)
+                block[2].append(values)
+                stillOpen[(left, right)] = block
+            openBlocks = stillOpen
+        return blocks
+
+    def writeDiff(self):
+        grid = self.buildGrid()
+        old = self.lastPublished
+        if old is None:
+            old = self.readGrid(len(grid), max(len(row) for row in grid))
+        data = []
+        for top, left, rows in GSheetPublisher.changedBlocks(old, grid):
+            data.append(
+                {
+                    "range": gdf.gdriveFile.a1Range(
+                        self.sheet,
+                        self.colNum + left,
+                        self.colNum + left + len(rows[0]) - 1,
+                        firstRow=self.row + top,
+                        lastRow=self.row + top + len(rows) - 1,
+                    ),
+                    "majorDimension": "ROWS",
+                    "values": rows,
+                }
+            )
+        if data:
+            self.doc.growSheetTo(
+                self.sheet,
+                self.row + len(grid) - 1,
+                self.colNum + max(len(row) for row in grid) - 1,
+            )
+            self.doc.writeValueRanges(data)
+
+        # until the writes have gone what's in the sheet isn't known, so a
+        # failed send means reading it back next time
+        self.lastPublished = None
+
+        def sent():
+            self.lastPublished = grid
+
+        self.doc.whenSent(sent)
+
+    def writeFrame(self):
+        multiIndex = (
+            type(self.dataFrame.index) == pd.pandas.core.indexes.multi.MultiIndex
+        )
+        firstColOffset = 1 if multiIndex else 0
+        # grow the sheet once to fit it all, as writeDiff does
+        self.doc.growSheetTo(
+            self.sheet,
+            self.row + len(self.dataFrame),
+            self.colNum + firstColOffset + len(self.dataFrame.columns),
+        )
         # First the 'frame'
         # Row titles
-        if type(self.dataFrame.index) == pd.pandas.core.indexes.multi.MultiIndex:
+        if multiIndex:
             self.doc.addData2d(
                 self.column,
                 self.row + 1,
                 [list(i) for i in list(self.dataFrame.index)],
                 arrayOf="ROW",
                 sheet=self.sheet,
-                growSheet=True,
             )
-            firstColOffset = 1
         else:
             self.doc.addData(
                 self.column,
@@ -187,7 +488,6 @@ class GSheetPublisher(object):
                 arrayRepresents="COLUMN",
                 sheet=self.sheet,
             )
-            firstColOffset = 0
         # Column Headings
         self.doc.addData(
             self.colNum + firstColOffset + 1,
@@ -203,31 +503,94 @@ class GSheetPublisher(object):
             self.renderData(),
             arrayOf="ROW",
             sheet=self.sheet,
-            growSheet=False,
-        )  # row titles must have grown the sheet
+        )
 
     def renderData(self):
-        data = self.dataFrame.values.tolist()
-        outData = []
-        for row in data:
-            outRow = []
-            for i, col in enumerate(row):
-                dfColname = self.dataFrame.columns[i]
-                fn = self.formatters.get(dfColname)
-                if fn is None:
-                    res = col
-                else:
-                    res = fn(col)
-                outRow.append(res)
+        """
+        the values as a list of row lists, with the formatters applied
+        a column at a time, the matrix is only built once
+        """
+        df = self.dataFrame
+        # datetimes with a date format go as serial day numbers
+        serial = [
+            i
+            for i, dfColname in enumerate(df.columns)
+            if self.numberFormats.get(dfColname, {}).get("type")
+            in GSheetPublisher.DATE_TYPES
+            and pd.api.types.is_datetime64_any_dtype(df.iloc[:, i])
+        ]
+        if not self.formatters and not self.columnFormatters and not serial:
+            return df.values.tolist()
+        out = df.to_numpy(dtype=object, copy=True)
+        for i, dfColname in enumerate(df.columns):
+            column = df.iloc[:, i]
+            if dfColname in self.columnFormatters:
+                res = np.asarray(self.columnFormatters[dfColname](column), dtype=object)
+                if res.shape != (len(df),):
+                    print(f"formatter for {dfColname} gave {res.shape} values")
+                    raise ValueError
+                out[:, i] = res
+            elif dfColname in self.formatters:
+                # the slow way, one cell at a time
+                fn = self.formatters[dfColname]
+                out[:, i] = [fn(col) for col in column.tolist()]
+            elif i in serial:
+                if column.dt.tz is not None:
+                    column = column.dt.tz_localize(None)
+                days = (
+                    column - pd.Timestamp(gdf.gdriveFile.SERIAL_DATE_ORIGIN)
+                ) / pd.Timedelta(days=1)
+                out[:, i] = days.astype(object).where(days.notna(), "")
+        return out.tolist()
 
-            # print(outRow)
-            outData.append(outRow.copy())
-        # print(outData)
-        return outData
+    def addNumberFormat(self, colname, numberFormat, pattern=None):
+        """
+        have the sheet format column colname, the values are sent as they
+        are (datetimes as serial dates) so formulas can still use them
+        numberFormat: one of NUMBER_FORMATS, eg "percent", or an API type,
+                      eg "CURRENCY", with its pattern, eg "[$$]#,##0.00"
+        A formatter on the same column still turns the values to text first
+        """
+        if colname not in self.dataFrame.columns:
+            print(f"{colname} is not a column name")
+            raise ValueError
+        if numberFormat in GSheetPublisher.NUMBER_FORMATS and pattern is None:
+            self.numberFormats[colname] = dict(
+                GSheetPublisher.NUMBER_FORMATS[numberFormat]
+            )
+        elif numberFormat in (
+            "TEXT",
+            "NUMBER",
+            "PERCENT",
+            "CURRENCY",
+            "DATE",
+            "TIME",
+            "DATE_TIME",
+            "SCIENTIFIC",
+        ):
+            self.numberFormats[colname] = {"type": numberFormat}
+            if pattern is not None:
+                self.numberFormats[colname]["pattern"] = pattern
+        else:
+            print(f"unknown number format {numberFormat}")
+            raise ValueError
 
-    def addFormatter(self, colname, function):
+    def addFormatter(self, colname, function, vectorized=False):
+        """
+        function formats the values of column colname for display
+        vectorized: False function takes a single value
+                    True function takes the whole column as a Series and
+                    returns a Series (or array) of the same length, which is
+                    much faster on big frames, eg
+                    pub.addFormatter("pct", lambda s: s.map("{:.1%}".format), True)
+        """
         if colname in self.dataFrame.columns:
-            self.formatters[colname] = function
+            self.formatters.pop(colname, None)
+            self.columnFormatters.pop(colname, None)
+            if vectorized:
+                self.columnFormatters[colname] = function
+            else:
+                self.formatters[colname] = function
         else:
             print(f"{colname} is not a column name")
             raise ValueError
@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  requestScheduler.py
+#
+#  Copyright 2020 Pete Siddall <pete.siddall@gmail.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+import itertools
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+
+import apiclient.errors
+import apiclient.http
+
+
+class TokenBucket(object):
+    """
+    Paces requests to rate a second, allowing bursts of up to burst.
+    The rate halves each time the api says it's too fast, and creeps
+    back up towards maxRate with each request which gets through
+    """
+
+    def __init__(self, maxRate, burst):
+        self.maxRate = maxRate
+        self.minRate = maxRate / 64
+        self.rate = maxRate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, n=1):
+        """
+        wait until n requests can go; more than burst at once (a batch)
+        goes when the bucket is full and leaves it owing
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                needed = min(n, self.burst)
+                if self.tokens >= needed:
+                    self.tokens -= n
+                    return
+                wait = (needed - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def slowDown(self):
+        with self.lock:
+            self.rate = max(self.minRate, self.rate / 2)
+            self.tokens = min(self.tokens, 0)
+
+    def speedUp(self):
+        with self.lock:
+            self.rate = min(self.maxRate, self.rate + self.maxRate / 50)
+
+
+class RequestScheduler(object):
+    """
+    Every request to the google apis goes through one of these, shared by
+    the whole process (gdriveAccess.SCHEDULER).  Each api has a token
+    bucket keeping it under its quota, sheets reads and writes having
+    separate quotas.  Requests refused for going too fast (429, or drive's
+    403 rate limit reasons) or failing on the server (5xx) or the network
+    are retried after a jittered exponential backoff, or the Retry-After
+    the api asks for, and rate limiting slows that api's bucket down.
+    Requests which could have taken effect twice, like an append, are only
+    retried when they were refused: after a server or network failure
+    they may have been applied, so the error is raised instead.
+
+    Services pick it up by being built with requestBuilder, so .execute()
+    calls need no changes.
+    """
+
+    # requests a second, burst; the default per user quotas are 60 a
+    # minute for sheets reads and writes and docs writes, and much more
+    # for drive
+    RATES = {
+        "drive": (20.0, 20),
+        "sheetsRead": (1.0, 10),
+        "sheetsWrite": (1.0, 10),
+        "docsRead": (5.0, 10),
+        "docsWrite": (1.0, 10),
+    }
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    RATE_LIMIT_REASONS = (
+        "rateLimitExceeded",
+        "userRateLimitExceeded",
+        "RATE_LIMIT_EXCEEDED",
+    )
+    THROTTLED_SECONDS = 30  # how long a rate limited api is avoided
+    IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE")
+    # posts which set or read values rather than add anything, so no harm
+    # is done if they go twice
+    IDEMPOTENT_POSTS = (
+        "/values:batchUpdate",
+        "/values:batchClear",
+        "/values:batchGetByDataFilter",
+        ":clear",
+    )
+
+    def __init__(self, rates=None, maxRetries=6, maxBackoff=64):
+        """
+        rates: {api: (requests a second, burst)} to change from RATES
+        """
+        rates = {**RequestScheduler.RATES, **(rates or {})}
+        self.buckets = {
+            api: TokenBucket(rate, burst)
+            for api, (rate, burst) in rates.items()
+        }
+        self.maxRetries = maxRetries
+        self.maxBackoff = maxBackoff
+        # for AccessPool to choose between credentials
+        self.inFlight = 0
+        self.throttledUntil = {}
+        self.lock = threading.Lock()
+
+    def throttledFor(self, buckets):
+        """
+        seconds until none of buckets has been rate limited recently
+        """
+        now = time.monotonic()
+        return max(
+            [self.throttledUntil.get(b, now) - now for b in buckets] + [0]
+        )
+
+    @staticmethod
+    def bucketFor(uri, method):
+        """
+        which quota a request counts against
+        """
+        url = urllib.parse.urlparse(uri)
+        write = method not in ("GET", "HEAD")
+        if url.netloc.startswith("sheets."):
+            return "sheetsWrite" if write else "sheetsRead"
+        if url.netloc.startswith("docs."):
+            return "docsWrite" if write else "docsRead"
+        return "drive"
+
+    @staticmethod
+    def idempotent(uri, method):
+        """
+        whether sending a request again after it may have been applied is
+        harmless
+        """
+        if method in RequestScheduler.IDEMPOTENT_METHODS:
+            return True
+        path = urllib.parse.urlparse(uri).path
+        return method == "POST" and path.endswith(
+            RequestScheduler.IDEMPOTENT_POSTS
+        )
+
+    def requestBuilder(self, *args, **kwargs):
+        """
+        for apiclient.discovery.build(requestBuilder=...)
+        """
+        request = ScheduledHttpRequest(*args, **kwargs)
+        request.scheduler = self
+        return request
+
+    def call(self, bucket, function, cost=1, idempotent=True):
+        """
+        function() once bucket allows cost more requests, retrying it as
+        described above
+        idempotent: False if function() mustn't be repeated after a server
+        or network failure
+        """
+        for attempt in itertools.count():
+            self.buckets[bucket].acquire(cost)
+            with self.lock:
+                self.inFlight += 1
+            try:
+                result = function()
+            except (apiclient.errors.HttpError, OSError) as e:
+                delay = self.retryDelay(bucket, e, attempt, idempotent)
+                if delay is None:
+                    raise
+                print(f"{bucket} request failed ({e}), retry in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            finally:
+                with self.lock:
+                    self.inFlight -= 1
+            self.buckets[bucket].speedUp()
+            return result
+
+    def retryDelay(self, bucket, error, attempt, idempotent=True):
+        """
+        how long to wait before trying again after error, or None if it's
+        not worth it, or not safe
+        """
+        kind = RequestScheduler.classify(error)
+        if kind is None or attempt >= self.maxRetries:
+            return None
+        if kind == "retry" and not idempotent:
+            return None
+        if kind == "slow":
+            self.throttle(bucket)
+        retryAfter = None
+        if isinstance(error, apiclient.errors.HttpError):
+            retryAfter = error.resp.get("retry-after")
+        elif isinstance(error, urllib.error.HTTPError):
+            retryAfter = error.headers.get("retry-after")
+        if retryAfter is not None and retryAfter.isdigit():
+            return float(retryAfter)
+        return self.backoff(attempt)
+
+    def throttle(self, bucket):
+        """
+        the api has said bucket's requests are coming too fast
+        """
+        self.buckets[bucket].slowDown()
+        with self.lock:
+            self.throttledUntil[bucket] = (
+                time.monotonic() + RequestScheduler.THROTTLED_SECONDS
+            )
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.maxBackoff, 2**attempt))
+
+    @staticmethod
+    def classify(error):
+        """
+        "slow" if the api says it's being asked too often, "retry" for a
+        server or network failure worth another go, otherwise None
+        urllib's HTTPError, from requests made outside the apis, counts too
+        """
+        if isinstance(error, urllib.error.HTTPError):
+            if error.code == 429:
+                return "slow"
+            if error.code in RequestScheduler.RETRY_STATUSES:
+                return "retry"
+            return None
+        if not isinstance(error, apiclient.errors.HttpError):
+            return "retry"
+        status = error.resp.status
+        if status == 429 or RequestScheduler.rateLimited(error):
+            return "slow"
+        if status in RequestScheduler.RETRY_STATUSES:
+            return "retry"
+        return None
+
+    @staticmethod
+    def rateLimited(error):
+        """
+        drive says it's being asked too often with a 403 and a reason
+        """
+        if error.resp.status != 403:
+            return False
+        try:
+            details = json.loads(error.content.decode("utf-8"))["error"]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return False
+        reasons = [e.get("reason") for e in details.get("errors", [])]
+        reasons.append(details.get("status"))
+        return any(r in RequestScheduler.RATE_LIMIT_REASONS for r in reasons)
+
+
+class ScheduledHttpRequest(apiclient.http.HttpRequest):
+    """
+    An api request whose execute (and next_chunk, for uploads) goes
+    through its scheduler
+    """
+
+    scheduler = None
+
+    def execute(self, http=None, num_retries=0):
+        return self.scheduler.call(
+            RequestScheduler.bucketFor(self.uri, self.method),
+            lambda: apiclient.http.HttpRequest.execute(
+                self, http=http, num_retries=num_retries
+            ),
+            idempotent=RequestScheduler.idempotent(self.uri, self.method),
+        )
+
+    def next_chunk(self, http=None, num_retries=0):
+        # a resumable upload picks up from where the server says it got to
+        # so a chunk can always go again
+        return self.scheduler.call(
+            RequestScheduler.bucketFor(self.uri, self.method),
+            lambda: apiclient.http.HttpRequest.next_chunk(
+                self, http=http, num_retries=num_retries
+            ),
+        )
+
+
+def main(args):
+    print("use import requestScheduler ONLY")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(main(sys.argv))
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  sheetAppender.py
+#
+#  Copyright 2020 Pete Siddall <pete.siddall@gmail.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+import queue
+import threading
+import time
+
+import gdriveFile as gdf
+
+
+class SheetAppender(object):
+    """
+    Append log style rows to the bottom of a sheet without waiting on the
+    network for each one.  append() puts the row on a bounded queue, from
+    any thread, and a background thread sends them with values().append
+    (INSERT_ROWS) once maxRows are waiting or the oldest has waited
+    maxSeconds.  When the queue is full append() blocks, so a producer
+    can't run away from the sheet.
+
+    with SheetAppender(gdoc, "Log") as log:
+        log.append([time.time(), "started"])
+        ...
+        log.flush()  # everything so far is in the sheet
+
+    Call close(), or leave the with block, to send what's left; rows still
+    queued when the process exits without it are lost.  If a send fails
+    the error is raised by the next append/flush/close.
+    """
+
+    def __init__(
+        self,
+        doc,
+        sheet=None,
+        startCol="A",
+        maxRows=500,
+        maxSeconds=2.0,
+        queueSize=10000,
+        valueInputOption="USER_ENTERED",
+    ):
+        assert doc.isSpreadSheet == True
+        doc.cacheFileInfo()
+        if sheet is None:
+            sheet = doc.defaultSheet
+        if sheet not in doc.sheets:
+            print(f"{sheet} is not in {doc.sheets}")
+            raise ValueError
+        if type(startCol) == str:
+            startCol = gdf.gdriveFile.string_colnum(startCol)
+        self.doc = doc
+        self.sheet = sheet
+        self.startCol = startCol
+        self.maxRows = maxRows
+        self.maxSeconds = maxSeconds
+        self.valueInputOption = valueInputOption
+        self.queue = queue.Queue(queueSize)
+        self.closed = False
+        # so append and flush don't queue anything after close
+        self.lock = threading.Lock()
+        self.error = None
+        self.rowsSent = 0
+        self.worker = threading.Thread(
+            target=self.run, name=f"SheetAppender {sheet}", daemon=True
+        )
+        self.worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def append(self, row, timeout=None):
+        """
+        queue one row, a list of cell values, waiting up to timeout seconds
+        (forever if None) for room, then raising queue.Full
+        """
+        self.raiseError()
+        # under the lock, so the row can't go behind close()'s stop marker
+        with self.lock:
+            if self.closed:
+                print("SheetAppender is closed")
+                raise ValueError
+            self.queue.put(list(row), timeout=timeout)
+
+    def flush(self, timeout=None):
+        """
+        send everything appended so far and wait for it to be in the sheet
+        returns False if it didn't happen within timeout seconds
+        """
+        sent = threading.Event()
+        with self.lock:
+            closed = self.closed
+            if not closed:
+                try:
+                    self.queue.put(sent, timeout=timeout)
+                except queue.Full:
+                    return False
+        if closed:
+            # the worker sends what's left and stops, nothing would set sent
+            self.worker.join(timeout)
+            done = not self.worker.is_alive()
+        else:
+            done = sent.wait(timeout)
+        self.raiseError()
+        return done
+
+    def close(self, timeout=None):
+        """
+        send what's left and stop the background thread
+        """
+        with self.lock:
+            if not self.closed:
+                self.closed = True
+                self.queue.put(None)
+        self.worker.join(timeout)
+        self.raiseError()
+
+    def raiseError(self):
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    def run(self):
+        # the doc's connection belongs to the thread which made it
+        service = self.doc.access.forThread().sheet_service
+        rows = []
+        deadline = None
+        while True:
+            if deadline is None:
+                wait = None
+            else:
+                wait = max(0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=wait)
+            except queue.Empty:
+                item = False  # the oldest row has waited long enough
+            if type(item) == list:
+                rows.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.maxSeconds
+                if len(rows) < self.maxRows:
+                    continue
+            if rows:
+                self.send(service, rows)
+            rows = []
+            deadline = None
+            if item is None:
+                return
+            if type(item) == threading.Event:
+                item.set()
+
+    def send(self, service, rows):
+        params = {
+            "spreadsheetId": self.doc.gdocId,
+            "range": gdf.gdriveFile.a1Range(self.sheet, self.startCol),
+            "valueInputOption": self.valueInputOption,
+            "insertDataOption": "INSERT_ROWS",
+            "body": {"majorDimension": "ROWS", "values": rows},
+        }
+        try:
+            resp = service.spreadsheets().values().append(**params).execute()
+        except Exception as e:
+            print(f"SheetAppender lost {len(rows)} rows: {e}")
+            self.error = e
+            return
+        self.rowsSent += len(rows)
+        # the sheet grew, keep the doc's idea of its size up to date
+        updatedRange = resp.get("updates", {}).get("updatedRange")
+        if updatedRange:
+            lastCol, lastRow = gdf.gdriveFile.rangeEnd(updatedRange)
+            gridSize = self.doc.sheetMaxSize[self.doc.sheets.index(self.sheet)]
+            if lastRow is not None and lastRow > gridSize["rowCount"]:
+                gridSize["rowCount"] = lastRow
+
+
+def main(args):
+    print("use import sheetAppender ONLY")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(main(sys.argv))